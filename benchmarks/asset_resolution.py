@@ -0,0 +1,329 @@
+"""
+Benchmarks of the Shotgun asset plug-in, runnable headless on Linux.
+
+Katana's ``AssetAPI`` and Shotgun Toolkit's ``sgtk`` are replaced by the
+stand-ins in ``benchmarks/stubs``. A synthetic directory tree, laid out like
+the Katana publish templates of ``config/core/templates.yml``, is generated
+with many shots, versions and render outputs, then the plug-in is timed
+resolving asset IDs against it.
+
+Usage::
+
+    python benchmarks/asset_resolution.py --output bench.json
+
+Results are written as JSON so runs can be compared over time.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_PATH = os.path.join(
+    os.path.dirname(BENCHMARKS_DIR),
+    "resources", "Katana", "AssetPlugins", "ShotgunAssetPlugin.py",
+)
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "stubs"))
+
+import sgtk  # noqa: E402 (stub)
+
+
+# Modelled on the shot publish templates of config/core/templates.yml
+PUBLISH_TEMPLATES = {
+    "katana_shot_publish": (
+        "{root}/{Shot}/publish/katana/scenes/{Shot}_{Step}_v{version}.katana"
+    ),
+    "katana_shot_publish_look_file": (
+        "{root}/{Shot}/publish/katana/scenes/klf/{name}/v{version}/"
+        "{Shot}_{Step}_{name}_v{version}.klf"
+    ),
+    "katana_shot_publish_render": (
+        "{root}/{Shot}/publish/katana/render/{name}/v{version}/"
+        "{katana.output}/{Shot}_{katana.output}_v{version}.{SEQ}.exr"
+    ),
+}
+
+STEP = "light"
+LOOK_NAME = "main"
+RENDER_NAME = "beauty"
+
+
+def build_tank(root):
+    """
+    Build a stub Tank holding the synthetic templates under ``root``.
+
+    :rtype: sgtk.Tank
+    """
+    keys = {
+        "Shot": sgtk.TemplateKey("Shot"),
+        "Step": sgtk.TemplateKey("Step"),
+        "name": sgtk.TemplateKey("name"),
+        "katana.output": sgtk.TemplateKey("katana.output"),
+        "version": sgtk.TemplateKey("version", "%03d", int),
+        "SEQ": sgtk.SequenceKey("SEQ"),
+    }
+    templates = {}
+    for name, definition in PUBLISH_TEMPLATES.items():
+        definition = definition.replace("{root}", root)
+        templates[name] = sgtk.Template(name, definition, keys)
+    return sgtk.Tank(templates)
+
+
+def generate_tree(tank, shots, versions, outputs, frames):
+    """
+    Create empty published files for every shot, version and render output.
+
+    :returns: Number of files created.
+    :rtype: int
+    """
+    count = 0
+    for shot_index in range(shots):
+        shot = "sh%03d0" % (shot_index + 1)
+        for version in range(1, versions + 1):
+            fields = {
+                "Shot": shot, "Step": STEP, "name": LOOK_NAME,
+                "version": version,
+            }
+            paths = [
+                tank.templates["katana_shot_publish"].apply_fields(fields),
+                tank.templates["katana_shot_publish_look_file"].apply_fields(fields),
+            ]
+            fields["name"] = RENDER_NAME
+            for output_index in range(outputs):
+                fields["katana.output"] = "aov%02d" % output_index
+                for frame in range(1001, 1001 + frames):
+                    fields["SEQ"] = frame
+                    paths.append(
+                        tank.templates["katana_shot_publish_render"].apply_fields(fields))
+
+            for path in paths:
+                folder = os.path.dirname(path)
+                if not os.path.isdir(folder):
+                    os.makedirs(folder)
+                open(path, "w").close()
+            count += len(paths)
+    return count
+
+
+def load_plugin(module_name="ShotgunAssetPlugin"):
+    """
+    Import the asset plug-in from its file, as Katana does.
+
+    :returns: The plug-in module.
+    """
+    os.environ["SGTK_CONTEXT"] = "benchmark"
+    try:
+        import importlib.util
+    except ImportError:
+        import imp
+        return imp.load_source(module_name, PLUGIN_PATH)
+    spec = importlib.util.spec_from_file_location(module_name, PLUGIN_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(func, repeat=5, number=1):
+    """
+    Time ``func``, keeping the best of ``repeat`` runs of ``number`` calls.
+
+    :returns: Best, mean and worst seconds per call.
+    :rtype: dict
+    """
+    runs = [
+        run / number for run in timeit.repeat(func, repeat=repeat, number=number)
+    ]
+    return {
+        "best_seconds": min(runs),
+        "mean_seconds": sum(runs) / len(runs),
+        "worst_seconds": max(runs),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def run_benchmarks(module, options):
+    """
+    Run every benchmark against the given plug-in module.
+
+    :rtype: dict
+    """
+    plugin = module.getPlugin()
+    shared_cache = plugin._sharedCache
+    results = {}
+
+    render_ids = [
+        module.formatAssetUri("katana_shot_publish_render", {
+            "Shot": "sh%03d0" % (shot_index + 1), "name": RENDER_NAME,
+            "katana.output": "aov%02d" % output_index, "version": version,
+        })
+        for shot_index in range(options.shots)
+        for output_index in range(options.outputs)
+        for version in (1, options.versions)
+    ]
+    render_id = render_ids[-1]
+    legacy_id = module.assetUriToLegacy(render_id)
+    latest_id = module.formatAssetUri("katana_shot_publish_look_file", {
+        "Shot": "sh0010", "Step": STEP, "name": LOOK_NAME, "version": 1,
+    })
+
+    def cold():
+        # Nothing cached anywhere: parse, glob and resolve from scratch
+        plugin.reset()
+        plugin._sharedCache = None
+        for asset_id in render_ids:
+            plugin.resolveAsset(asset_id)
+        plugin._sharedCache = shared_cache
+
+    def shared_warm():
+        # New process on a host where another one already resolved the IDs
+        plugin.reset()
+        for asset_id in render_ids:
+            plugin.resolveAsset(asset_id)
+
+    def warm():
+        for asset_id in render_ids:
+            plugin.resolveAsset(asset_id)
+
+    cold_result = measure(cold, repeat=options.repeat)
+    # Prime the shared cache, then the in-memory one
+    shared_warm()
+    shared_result = measure(shared_warm, repeat=options.repeat)
+    warm_result = measure(warm, repeat=options.repeat, number=10)
+    for name, result in (
+            ("resolveAsset_cold", cold_result),
+            ("resolveAsset_shared_cache", shared_result),
+            ("resolveAsset_warm", warm_result)):
+        result["asset_ids"] = len(render_ids)
+        result["seconds_per_asset_id"] = result["best_seconds"] / len(render_ids)
+        results[name] = result
+
+    def single_cold():
+        # Like cold(), the shared cache would otherwise answer
+        plugin.reset()
+        plugin._sharedCache = None
+        plugin.resolveAsset(render_id)
+        plugin._sharedCache = shared_cache
+
+    results["resolveAsset_single_cold"] = measure(
+        single_cold, repeat=options.repeat, number=20)
+
+    # Typical parameter values: nearly all plain paths
+    values = [
+        "/show/seq/sh0010/lighting/render/beauty.####.exr",
+        "/show/assets/chair/textures/diffuse.<UDIM>.tx",
+        "1001",
+        "",
+        "primary",
+    ] * 200 + [render_id, legacy_id]
+    results["isAssetId"] = measure(
+        lambda: [plugin.isAssetId(value) for value in values],
+        repeat=options.repeat, number=10,
+    )
+    results["isAssetId"]["values"] = len(values)
+
+    plugin.reset()
+    results["parse_compact_id"] = measure(
+        lambda: module.parseAssetId(render_id), repeat=options.repeat, number=1000)
+    results["parse_legacy_id"] = measure(
+        lambda: module.parseAssetId(legacy_id), repeat=options.repeat, number=1000)
+
+    long_string = " ".join(
+        token
+        for asset_id in render_ids[:options.tokens]
+        for token in (asset_id, "-flag", "/some/plain/path.exr")
+    )
+    plugin.reset()
+    results["resolveAllAssets_cold"] = measure(
+        lambda: (plugin.reset(), plugin.resolveAllAssets(long_string)),
+        repeat=options.repeat,
+    )
+    results["resolveAllAssets_warm"] = measure(
+        lambda: plugin.resolveAllAssets(long_string),
+        repeat=options.repeat, number=10,
+    )
+    for name in ("resolveAllAssets_cold", "resolveAllAssets_warm"):
+        results[name]["string_length"] = len(long_string)
+
+    frames = range(1, options.frames + 1)
+    plugin.reset()
+    results["resolvePath_frames"] = measure(
+        lambda: [plugin.resolvePath(render_id, frame) for frame in frames],
+        repeat=options.repeat,
+    )
+    results["resolvePath_frames"]["frames"] = options.frames
+
+    results["resolveAssetVersion_latest_cold"] = measure(
+        lambda: (plugin.reset(), plugin.resolveAssetVersion(latest_id, "latest")),
+        repeat=options.repeat, number=5,
+    )
+    results["resolveAssetVersion_latest_warm"] = measure(
+        lambda: plugin.resolveAssetVersion(latest_id, "latest"),
+        repeat=options.repeat, number=100,
+    )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--shots", type=int, default=10)
+    parser.add_argument("--versions", type=int, default=50)
+    parser.add_argument("--outputs", type=int, default=4, help="Render outputs (AOVs)")
+    parser.add_argument("--frames-on-disk", type=int, default=3, dest="frames_on_disk")
+    parser.add_argument("--frames", type=int, default=10000, help="Frames for resolvePath")
+    parser.add_argument("--tokens", type=int, default=100, help="Asset IDs for resolveAllAssets")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="JSON file to write, stdout by default")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated tree")
+    options = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    work_dir = tempfile.mkdtemp(prefix="tk_katana_bench_")
+    try:
+        root = os.path.join(work_dir, "project")
+        os.environ["SGTK_KATANA_ASSET_CACHE_DIR"] = os.path.join(work_dir, "cache")
+        os.environ.pop("SGTK_KATANA_ASSET_METRICS_FILE", None)
+
+        sgtk.current_tank = build_tank(root)
+        start = time.time()
+        file_count = generate_tree(
+            sgtk.current_tank, options.shots, options.versions,
+            options.outputs, options.frames_on_disk,
+        )
+        generation_seconds = time.time() - start
+
+        module = load_plugin()
+        report = {
+            "time": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": dict(vars(options), files=file_count),
+            "tree_generation_seconds": generation_seconds,
+            "benchmarks": run_benchmarks(module, options),
+            "plugin_metrics": module.dumpMetrics(),
+        }
+    finally:
+        if options.keep:
+            print("Generated tree kept in %s" % work_dir, file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, "w") as handle:
+            handle.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Minimal stand-in for Katana's ``AssetAPI`` so the Shotgun asset plug-in can
+be imported and benchmarked outside of Katana.
+"""
+import re
+
+
+class BaseAssetPlugin(object):
+    """Stand-in for ``AssetAPI.BaseAssetPlugin``."""
+
+
+class BaseAssetTransaction(object):
+    """Stand-in for ``AssetAPI.BaseAssetTransaction``."""
+
+
+class FileSequence(object):
+    """
+    A ``%04d`` style file sequence path.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def getResolvedPath(self, frame):
+        return self.path % frame
+
+
+class FileSequencePlugin(object):
+    """
+    Recognises ``%0Nd`` file sequence paths, like Katana's default plug-in.
+    """
+    PATTERN = re.compile(r"%0\dd")
+
+    def isFileSequence(self, path):
+        return bool(self.PATTERN.search(path))
+
+    def getFileSequence(self, path):
+        return FileSequence(path)
+
+
+_plugins = {}
+_file_sequence_plugin = FileSequencePlugin()
+
+
+def RegisterAssetPlugin(name, plugin):
+    _plugins[name] = plugin
+
+
+def GetAssetPlugin(name):
+    return _plugins.get(name)
+
+
+def GetDefaultFileSequencePlugin():
+    return _file_sequence_plugin
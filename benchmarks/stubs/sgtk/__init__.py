@@ -0,0 +1,162 @@
+"""
+Minimal stand-in for Shotgun Toolkit's ``sgtk`` so the Shotgun asset plug-in
+can be benchmarked without a Shotgun site or pipeline configuration.
+
+Only what the plug-in uses is implemented: templates with string, integer
+and frame sequence keys, ``abstract_paths_from_template`` globbing the disk
+and a context deserialising to a :class:`Tank` set up by the benchmarks.
+"""
+import glob
+import logging
+import re
+
+
+class TemplateKey(object):
+    """
+    A template key formatting its values with ``format_spec``.
+    """
+    def __init__(self, name, format_spec="%s", value_type=str):
+        self.name = name
+        self.format_spec = format_spec
+        self.value_type = value_type
+
+    def str_from_value(self, value):
+        if isinstance(value, str) and self.value_type is not str:
+            # Abstract or glob values, e.g. "%04d" or "*"
+            return value
+        return self.format_spec % value
+
+    def value_from_str(self, string):
+        return self.value_type(string)
+
+
+class SequenceKey(TemplateKey):
+    """
+    A frame number key, ``%04d`` in abstract paths.
+    """
+    def __init__(self, name):
+        super(SequenceKey, self).__init__(name, "%04d", int)
+
+    def value_from_str(self, string):
+        if string.startswith("%") or string.startswith("#"):
+            return string
+        return int(string)
+
+
+class Template(object):
+    """
+    A path template like ``/root/{Shot}/v{version}/{Shot}.{SEQ}.exr``.
+    """
+    TOKEN = re.compile(r"\{([^}]+)\}")
+
+    def __init__(self, name, definition, keys):
+        self.name = name
+        self.definition = definition
+        self.keys = dict(
+            (key, keys[key]) for key in self.TOKEN.findall(definition)
+        )
+
+        pattern = []
+        seen = set()
+        position = 0
+        for match in self.TOKEN.finditer(definition):
+            pattern.append(re.escape(definition[position:match.start()]))
+            key = match.group(1)
+            group = "k%d" % sorted(self.keys).index(key)
+            if key in seen:
+                pattern.append("(?P=%s)" % group)
+            else:
+                pattern.append("(?P<%s>[^/]+?)" % group)
+                seen.add(key)
+            position = match.end()
+        pattern.append(re.escape(definition[position:]))
+        self._regex = re.compile("^%s$" % "".join(pattern))
+
+    def apply_fields(self, fields):
+        return self.TOKEN.sub(
+            lambda match: self.keys[match.group(1)].str_from_value(
+                fields[match.group(1)]),
+            self.definition,
+        )
+
+    def get_fields(self, path):
+        match = self._regex.match(path)
+        if not match:
+            return {}
+        ordered = sorted(self.keys)
+        return dict(
+            (ordered[int(group[1:])], self.keys[ordered[int(group[1:])]].value_from_str(value))
+            for group, value in match.groupdict().items()
+        )
+
+    def validate(self, path):
+        return bool(self._regex.match(path))
+
+
+class PipelineConfiguration(object):
+    def __init__(self, path):
+        self._path = path
+
+    def get_path(self):
+        return self._path
+
+
+class Tank(object):
+    """
+    Holds the templates and resolves them against the disk.
+    """
+    def __init__(self, templates, path="/benchmark/config"):
+        self.templates = templates
+        self.pipeline_configuration = PipelineConfiguration(path)
+        self.shotgun = None
+
+    def abstract_paths_from_template(self, template, fields):
+        glob_fields = dict(fields)
+        for key in template.keys:
+            if key not in glob_fields or isinstance(template.keys[key], SequenceKey):
+                glob_fields[key] = "*"
+
+        found = set()
+        for path in glob.glob(template.apply_fields(glob_fields)):
+            path_fields = template.get_fields(path)
+            for key, template_key in template.keys.items():
+                if isinstance(template_key, SequenceKey):
+                    path_fields[key] = "%04d"
+            found.add(template.apply_fields(path_fields))
+        return sorted(found)
+
+
+class _Context(object):
+    def __init__(self, tank):
+        self.tank = tank
+        self.sgtk = tank
+
+
+class _ContextModule(object):
+    """
+    ``sgtk.context`` stand-in, deserialising any string to the context of
+    :data:`current_tank`.
+    """
+    @staticmethod
+    def deserialize(serialised_context):
+        return _Context(current_tank)
+
+
+class _PlatformModule(object):
+    """
+    ``sgtk.platform`` stand-in.
+    """
+    @staticmethod
+    def get_logger(name):
+        return logging.getLogger(name)
+
+
+class TankError(Exception):
+    pass
+
+
+# The Tank returned by every deserialised context, set by the benchmarks
+current_tank = None
+
+context = _ContextModule()
+platform = _PlatformModule()
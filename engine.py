@@ -73,6 +73,9 @@ class KatanaEngine(sgtk.platform.Engine):
 
     def __init__(self, *args, **kwargs):
         self._ui_enabled = bool(Configuration.get('KATANA_UI_MODE'))
+        self._render_output_index = None
+        self._render_metadata_cache = None
+        self._scene_index = None
         super(KatanaEngine, self).__init__(*args, **kwargs)
 
         # Add Katana's handlers to engine's Shotgun logger
@@ -131,6 +134,48 @@ class KatanaEngine(sgtk.platform.Engine):
         # Make sure callbacks tracking the context switching are active.
         tk_katana.tank_ensure_callbacks_registered()
 
+        self._scene_index = tk_katana.SceneIndex()
+        self._scene_index.register()
+        self._render_output_index = tk_katana.RenderOutputIndex(self._scene_index)
+        self._render_output_index.register()
+        self._render_metadata_cache = tk_katana.exr.MetadataCache()
+
+        if self.has_ui:
+            self.register_command(
+                "Bake Look Files in Parallel",
+                lambda: tk_katana.bake_scene_look_files(self),
+                {"short_name": "bake_look_files", "type": "context_menu"},
+            )
+
+    @property
+    def render_output_index(self):
+        """Index of the scene's Render node outputs, shared by publish hooks.
+
+        Returns:
+            tk_katana.RenderOutputIndex: Output location to enabled state.
+        """
+        return self._render_output_index
+
+    @property
+    def scene_index(self):
+        """Index of the scene's nodes by type and of their Shotgun parameters,
+        kept up to date from nodegraph events.
+
+        Returns:
+            tk_katana.SceneIndex: The scene index.
+        """
+        return self._scene_index
+
+    @property
+    def render_metadata_cache(self):
+        """Channels, resolution and compression of render outputs, read from
+        one frame header per sequence and shared by publish hooks.
+
+        Returns:
+            tk_katana.exr.MetadataCache: Metadata by sequence path.
+        """
+        return self._render_metadata_cache
+
     def post_app_init(self):
         if self.has_ui:
             try:
@@ -153,6 +198,11 @@ class KatanaEngine(sgtk.platform.Engine):
                 )
 
     def destroy_engine(self):
+        if self._render_output_index is not None:
+            self._render_output_index.unregister()
+        if self._scene_index is not None:
+            self._scene_index.unregister()
+
         if self.has_ui and self.main_window_ready():
             self.logger.debug("%s: Destroying...", self)
             try:
@@ -15,8 +15,6 @@ import textwrap
 import sgtk
 from sgtk.platform.qt import QtGui
 
-from Katana import NodegraphAPI
-
 HookBaseClass = sgtk.get_hook_baseclass()
 
 
@@ -207,6 +205,15 @@ class KatanaLookFilePublishPlugin(HookBaseClass):
                 "default": "",
                 "description": ""
             },
+            "deduplicate": {
+                "type": "bool",
+                "default": False,
+                "description": (
+                    "Hard link look files identical to a version already published "
+                    "instead of copying them, using an index of the published "
+                    "contents kept in the publish area."
+                )
+            },
         }
 
     @property
@@ -272,12 +279,12 @@ class KatanaLookFilePublishPlugin(HookBaseClass):
         :returns: dictionary with boolean keys accepted, required and enabled
         """
         settings["node"].value = item.name
-        node = NodegraphAPI.GetNode(item.name)
-        path_param = node.getParameter("sg_saveTo")
-        path = path_param.getValue(0)
+        # Cached by the scene index, no need to walk the node's parameters
+        scene_index = sgtk.platform.current_engine().scene_index
+        parameters = scene_index.get_parameter_values(item.name)
+        path = parameters.get("sg_saveTo", "")
         item.properties["path"] = path
-        work_param = node.getParameter("sg_work_template")
-        work_template_name = work_param.getValue(0)
+        work_template_name = parameters.get("sg_work_template", "")
         work_template = self._get_template(work_template_name)
         item.properties["work_template"] = work_template
 
@@ -296,27 +303,25 @@ class KatanaLookFilePublishPlugin(HookBaseClass):
             )
             return {"accepted": False, "visible": True, "enabled": True, "checked": False}
 
-        publish_param = node.getParameter("sg_publish_template")
-        publish_template_name = publish_param.getValue(0)
+        publish_template_name = parameters.get("sg_publish_template", "")
         publish_template = self._get_template(publish_template_name)
         item.properties["publish_template"] = publish_template
-        publish_paths = self.sgtk.abstract_paths_from_template(publish_template, fields)
+        if not publish_template:
+            self.logger.debug(
+                "'{}': Publish template '{}' doesn't exist".format(item.name, publish_template_name)
+            )
+            return {"accepted": False, "visible": False, "enabled": False, "checked": False}
+        # A single scan of the look's publish area
+        published_versions = self._get_published_versions(publish_template, fields)
 
-        work_paths_to_publish = sorted(work_paths, reverse=True)
-        publish_fields = {}
-        for work_path in work_paths:
-            work_fields = work_template.get_fields(work_path)
+        work_paths_to_publish = []
+        for work_path in sorted(work_paths, reverse=True):
+            work_fields = self._get_fields(work_template, work_path)
             self.logger.debug("Checking '{}'".format(work_path))
-            for publish_path in publish_paths:
-                # cache result as this might be slow
-                if publish_path not in publish_fields:
-                    publish_fields[publish_path] = publish_template.get_fields(publish_path)
-                publish_fields = publish_fields[publish_path]
-                if os.path.exists(publish_path) and publish_fields["version"] == work_fields["version"]:
-                    self.logger.debug("'{}' already published".format(work_path))
-                    # publish version exists
-                    work_paths_to_publish.remove(work_path)
-                    break
+            if self._is_published(published_versions, work_fields["version"]):
+                self.logger.debug("'{}' already published".format(work_path))
+            else:
+                work_paths_to_publish.append(work_path)
 
         if not work_paths_to_publish:
             self.logger.debug(
@@ -335,6 +340,52 @@ class KatanaLookFilePublishPlugin(HookBaseClass):
             "checked": True
         }
     
+    @staticmethod
+    def _get_published_versions(publish_template, fields):
+        """
+        Get the versions already published for the given fields.
+
+        :param publish_template: The publish template.
+        :param fields: The template fields, without the version.
+        :type fields: dict
+        :rtype: `tk_katana.VersionIndex`
+        """
+        tk_katana = sgtk.platform.current_engine().import_module("tk_katana")
+        return tk_katana.VersionIndex(publish_template, fields)
+
+    @staticmethod
+    def _is_published(published_versions, version):
+        """
+        Whether a version was fully published. Versions copied but whose
+        registration failed or was interrupted can be published again.
+
+        :param published_versions: The published versions.
+        :type published_versions: `tk_katana.VersionIndex`
+        :param int version: The version to check.
+        :rtype: bool
+        """
+        if version not in published_versions:
+            return False
+        tk_katana = sgtk.platform.current_engine().import_module("tk_katana")
+        publish_folder = os.path.dirname(published_versions.paths[version])
+        return not tk_katana.PublishManifest.is_incomplete(publish_folder)
+
+    def _get_fields(self, template, path):
+        """
+        Get the fields of a path, parsing it only once for all the items.
+
+        :param template: The template to parse the path with.
+        :param str path: The path to parse.
+        :rtype: dict
+        """
+        fields_cache = getattr(self, "_fields_cache", None)
+        if fields_cache is None:
+            fields_cache = self._fields_cache = {}
+        key = (template.name, path)
+        if key not in fields_cache:
+            fields_cache[key] = template.get_fields(path)
+        return fields_cache[key]
+
     @staticmethod
     def _get_template(template_name):
         """
@@ -377,7 +428,11 @@ class KatanaLookFilePublishPlugin(HookBaseClass):
         publish_path = publish_template.apply_fields(fields)
         item.properties["publish_path"] = publish_path
         item.properties["path"] = path
-        if os.path.exists(publish_path):
+        # A publish left incomplete, e.g. copied but never registered, is
+        # resumed instead
+        tk_katana = sgtk.platform.current_engine().import_module("tk_katana")
+        if os.path.exists(publish_path) and not tk_katana.PublishManifest.is_incomplete(
+                os.path.dirname(publish_path)):
             raise IOError(errno.EEXIST, "The file '{}' has already been copied to the publish location.".format(path))
 
         return True
@@ -400,7 +455,100 @@ class KatanaLookFilePublishPlugin(HookBaseClass):
 
         item.properties["publish_type"] = "Katana Look File"
 
-        super(KatanaLookFilePublishPlugin, self).publish(settings, item)
+        # Textures and other files the look file references, resolved to
+        # their publishes with a single query for all the items when the
+        # publishes are registered
+        tk_katana = engine.import_module("tk_katana")
+        dependencies = tk_katana.find_referenced_paths(item.properties["path"])
+        self.logger.debug(
+            "'{}' references {} file(s)".format(item.properties["path"], len(dependencies))
+        )
+        item.properties["publish_dependencies"] = dependencies
+
+        # Registered with the other look files and renders when finalizing
+        tk_katana.defer_publish(self, settings, item)
+
+    def finalize(self, settings, item):
+        """
+        Execute the finalization pass. This pass executes once all the publish
+        tasks have completed, and can for example be used to version up files.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        """
+        tk_katana = sgtk.platform.current_engine().import_module("tk_katana")
+        tk_katana.finalize_publish(self, item)
+        super(KatanaLookFilePublishPlugin, self).finalize(settings, item)
+
+    def _copy_work_to_publish(self, settings, item):
+        """
+        Copy the look file to the publish area, checksumming it while copying.
+
+        The checksum is recorded in a manifest next to the published file,
+        so loaders can verify it without Shotgun. When deduplicating, a look
+        file identical to one already published is linked to it instead.
+
+        :param settings: Dictionary of Settings.
+        :param item: Item to process
+        """
+        tk_katana = sgtk.platform.current_engine().import_module("tk_katana")
+        path = item.properties["path"]
+        publish_path = item.properties["publish_path"]
+        if settings["deduplicate"].value:
+            item.properties["checksums"] = self._copy_deduplicated(tk_katana, item, path, publish_path)
+            return
+
+        checksums = {}
+        try:
+            tk_katana.transfer_files([(path, publish_path)], resume=True, checksums=checksums)
+        except tk_katana.TransferError as e:
+            raise sgtk.TankError(str(e))
+        item.properties["checksums"] = checksums
+
+    def _copy_deduplicated(self, tk_katana, item, path, publish_path):
+        """
+        Publish a look file through the content index of its publish area.
+
+        :returns: The checksum of the published file, by path.
+        :rtype: dict[str, str]
+        """
+        publish_area = self._get_publish_area(item)
+        content_index = tk_katana.ContentIndex(publish_area)
+        try:
+            method, checksum = tk_katana.transfer_deduplicated(path, publish_path, content_index)
+        except (IOError, OSError) as e:
+            raise sgtk.TankError("Failed to publish '{}': {}".format(path, e))
+        if method != tk_katana.transfer.COPY:
+            self.logger.info("Identical to a published look file, linked rather than copied.")
+
+        publish_folder, name = os.path.split(publish_path)
+        manifest = tk_katana.PublishManifest(publish_folder)
+        manifest.record(name, os.stat(path), checksum)
+        manifest.save()
+        return {publish_path: checksum}
+
+    def _get_publish_area(self, item):
+        """
+        Get the folder holding all the published versions of a look file,
+        found by applying the publish template with two versions.
+
+        :param item: Item to process
+        :rtype: str
+        """
+        publish_template = item.properties["publish_template"]
+        fields = self._get_fields(publish_template, item.properties["publish_path"])
+        folders = []
+        for version in (1, 2):
+            path = publish_template.apply_fields(dict(fields, version=version))
+            folders.append(os.path.dirname(path).split(os.sep))
+        common = []
+        for first, second in zip(*folders):
+            if first != second:
+                break
+            common.append(first)
+        return os.sep.join(common)
 
     def create_settings_widget(self, parent):
         """
@@ -8,16 +8,13 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
-from collections import defaultdict
-import glob
 import os
-import re
 import textwrap
 
 import sgtk
 from sgtk.platform.qt import QtGui
 
-from Katana import NodegraphAPI, Nodes3DAPI
+from Katana import Nodes3DAPI
 
 HookBaseClass = sgtk.get_hook_baseclass()
 
@@ -44,7 +41,33 @@ class RenderPublishWidgetItem(QtGui.QWidget):
         layout.addWidget(label)
         self._combo = QtGui.QComboBox(parent=self)
         layout.addWidget(self._combo)
+        self._metadata = dict(data.get("metadata", {}))
+        self._sequence_scanner = None
+        self._metadata_label = QtGui.QLabel(parent=self)
+        layout.addWidget(self._metadata_label)
         self._populate(self._combo, data)
+        self._combo.currentIndexChanged.connect(self._update_metadata)
+        self._update_metadata()
+
+    def _update_metadata(self, *args):
+        """
+        Show the channels, resolution and compression of the selected version,
+        read when it is first selected.
+        """
+        path = self._combo.itemData(self._combo.currentIndex())
+        if path and path not in self._metadata:
+            if self._sequence_scanner is None:
+                tk_katana = sgtk.platform.current_engine().import_module("tk_katana")
+                self._sequence_scanner = tk_katana.SequenceScanner()
+            self._metadata[path] = _get_render_metadata(path, self._sequence_scanner)
+        metadata = self._metadata.get(path)
+        if not metadata:
+            self._metadata_label.setText("")
+            return
+        exr = sgtk.platform.current_engine().import_module("tk_katana").exr
+        text = exr.format_metadata(metadata)
+        self._metadata_label.setText(text)
+        self._metadata_label.setToolTip(text)
 
     @staticmethod
     def _populate(combo, data):
@@ -79,7 +102,8 @@ class RenderPublishWidgetItem(QtGui.QWidget):
         return {
             self.__name: {
                 "work_paths": work_paths,
-                "to_publish": to_publish
+                "to_publish": to_publish,
+                "metadata": self._metadata,
             }
         }
 
@@ -211,6 +235,35 @@ class KatanaRenderPublishPlugin(HookBaseClass):
                 "default": "",
                 "description": ""
             },
+            "copy_workers": {
+                "type": "int",
+                "default": 8,
+                "description": "Number of frames copied to the publish area at once."
+            },
+            "hardlink_frames": {
+                "type": "bool",
+                "default": False,
+                "description": (
+                    "Hard link the frames to the publish area rather than copying "
+                    "them when they are on the same filesystem. Copy-on-write clones "
+                    "are always tried first where supported. Only enable this if work "
+                    "renders are never overwritten in place: re-rendering a hard "
+                    "linked frame also changes the published one."
+                )
+            },
+            "validate_workers": {
+                "type": "int",
+                "default": 8,
+                "description": "Number of EXR frames whose headers are checked at once."
+            },
+            "verify_checksums": {
+                "type": "bool",
+                "default": False,
+                "description": (
+                    "When resuming a publish, compare the checksums of the frames "
+                    "already published rather than their sizes and modification times."
+                )
+            },
         }
 
     @property
@@ -250,25 +303,19 @@ class KatanaRenderPublishPlugin(HookBaseClass):
         all_settings = settings["node_settings"].value
         all_settings[node] = node_settings
 
-    def _get_all_render_node_paths(self):
+    @staticmethod
+    def _get_render_output_index():
         """
-        Get all the paths and their enabled state from all the render nodes.
+        Get the index of all the paths and their enabled state from all the
+        render nodes.
 
-        :rtype: `dict`
+        It is built once and shared by all the render items, until a render
+        node changes.
+
+        :rtype: `tk_katana.RenderOutputIndex`
         """
-        if not hasattr(self, "__render_paths"):
-            def false_factory():
-                return False
-            render_paths = defaultdict(false_factory)
-            render_nodes = NodegraphAPI.GetAllNodesByType("Render")
-            for node in render_nodes:
-                outputs = node.getParameter("outputs")
-                locations = [x.getValue(0) for x in outputs.getChild("locations").getChildren()]
-                enabled_flags = [x.getValue(0) for x in outputs.getChild("enabledFlags").getChildren()]
-                for path, enabled in zip(locations, enabled_flags):
-                    render_paths[path] |= bool(enabled)  # At least one enabled to make it enabled
-            self.__render_paths = dict(render_paths)
-        return self.__render_paths
+        engine = sgtk.platform.current_engine()
+        return engine.render_output_index
 
     def accept(self, settings, item):
         """
@@ -321,23 +368,16 @@ class KatanaRenderPublishPlugin(HookBaseClass):
             )
             return {"accepted": False, "visible": True, "enabled": True, "checked": False}
         fields["SEQ"] = "####"
-        publish_paths = self.sgtk.abstract_paths_from_template(publish_template, fields)
+        published_versions = self._get_published_versions(publish_template, fields)
 
-        work_paths_to_publish = sorted(work_paths, reverse=True)
-        publish_fields = {}
-        for work_path in work_paths:
+        work_paths_to_publish = []
+        for work_path in sorted(work_paths, reverse=True):
             work_fields = work_template.get_fields(work_path)
             self.logger.debug("Checking '{}'".format(work_path))
-            for publish_path in publish_paths:
-                # cache result as this might be slow
-                if publish_path not in publish_fields:
-                    publish_fields[publish_path] = publish_template.get_fields(publish_path)
-                this_publish_fields = publish_fields[publish_path]
-                if glob.glob(publish_path.replace("####", "*")) and this_publish_fields["version"] == work_fields["version"]:
-                    self.logger.debug("'{}' already published".format(work_path))
-                    # publish version exists
-                    work_paths_to_publish.remove(work_path)
-                    break
+            if self._is_published(published_versions, work_fields["version"]):
+                self.logger.debug("'{}' already published".format(work_path))
+            else:
+                work_paths_to_publish.append(work_path)
         self.logger.debug("Work_paths_to_publish: {!r}".format(work_paths_to_publish))
         if not work_paths_to_publish:
             self.logger.debug(
@@ -345,7 +385,7 @@ class KatanaRenderPublishPlugin(HookBaseClass):
             )
             return {"accepted": False, "visible": True, "enabled": False, "checked": False}
 
-        render_paths = self._get_all_render_node_paths()
+        render_paths = self._get_render_output_index()
         if path not in render_paths:
             self.logger.warn(
                 (
@@ -365,14 +405,52 @@ class KatanaRenderPublishPlugin(HookBaseClass):
         settings_dict = {
             "work_paths": work_paths_to_publish,
             "to_publish": work_paths_to_publish[0],
+            # Other versions are read by the settings widget once selected,
+            # keeping collection to a single header read per output
+            "metadata": {
+                work_paths_to_publish[0]: self._get_render_metadata(work_paths_to_publish[0]),
+            },
         }
         self._set_item_settings(settings_dict, settings)
 
         return {
             "accepted": True,
-            "checked": render_paths[path]
+            "checked": render_paths.is_enabled(path)
         }
     
+    @staticmethod
+    def _get_published_versions(publish_template, fields):
+        """
+        Get the versions already published for the given fields.
+
+        The publish area of the output is walked once, instead of globbing
+        every version of it.
+
+        :param publish_template: The publish template.
+        :param fields: The template fields, without the version.
+        :type fields: dict
+        :rtype: `tk_katana.VersionIndex`
+        """
+        tk_katana = sgtk.platform.current_engine().import_module("tk_katana")
+        return tk_katana.VersionIndex(publish_template, fields)
+
+    @staticmethod
+    def _is_published(published_versions, version):
+        """
+        Whether a version was fully published. Versions whose publish failed
+        or was interrupted can be published again, resuming where it stopped.
+
+        :param published_versions: The published versions.
+        :type published_versions: `tk_katana.VersionIndex`
+        :param int version: The version to check.
+        :rtype: bool
+        """
+        if version not in published_versions:
+            return False
+        tk_katana = sgtk.platform.current_engine().import_module("tk_katana")
+        publish_folder = os.path.dirname(published_versions.paths[version])
+        return not tk_katana.PublishManifest.is_incomplete(publish_folder)
+
     @staticmethod
     def _get_template(template_name):
         """
@@ -402,19 +480,108 @@ class KatanaRenderPublishPlugin(HookBaseClass):
         # Check the filepath is valid
         if not work_template.validate(path):
             raise sgtk.TankError("The filepath '{}' does not match the template '{}'".format(path, work_template.name))
-        # Check it exists on disk
-        glob_path = re.sub(r"\..+\.", ".*.", path)
-        if not glob.glob(glob_path):
+        # Check it exists on disk, listing its folder a single time
+        sequence = self._get_sequence_scanner().find(path)
+        if sequence is None or not sequence.frames:
             raise sgtk.TankError("The filepath '{}' does not exist on disk".format(path))
+        missing_frames = sequence.missing_frames
+        if missing_frames:
+            tk_katana = sgtk.platform.current_engine().import_module("tk_katana")
+            self.logger.warning(
+                "'{}': {} missing frames: {}".format(
+                    path, len(missing_frames),
+                    tk_katana.format_frame_ranges(
+                        tk_katana.compact_frame_ranges(missing_frames)),
+                )
+            )
+        if sequence.suffix.lower() == ".exr":
+            self._check_exr_frames(sequence, settings["validate_workers"].value)
         fields = work_template.validate_and_get_fields(path)
         publish_path = publish_template.apply_fields(fields)
         item.properties["publish_path"] = publish_path
         item.properties["path"] = path
+        item.properties["frame_ranges"] = sequence.ranges
+        item.properties["render_metadata"] = self._get_render_metadata(path)
         image_seq = self._get_sequence_paths(item)
         if image_seq:
             item.properties["sequence_paths"] = image_seq
         return super(KatanaRenderPublishPlugin, self).validate(settings, item)
 
+    def publish(self, settings, item):
+        """
+        Executes the publish logic for the given item and settings.
+
+        The frames are copied right away, but the publish is only registered
+        in Shotgun with the ones of all the other outputs when finalizing.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        """
+        tk_katana = sgtk.platform.current_engine().import_module("tk_katana")
+        tk_katana.defer_publish(self, settings, item)
+
+    def finalize(self, settings, item):
+        """
+        Execute the finalization pass. This pass executes once all the publish
+        tasks have completed, and can for example be used to version up files.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        """
+        tk_katana = sgtk.platform.current_engine().import_module("tk_katana")
+        tk_katana.finalize_publish(self, item)
+        super(KatanaRenderPublishPlugin, self).finalize(settings, item)
+
+    def _check_exr_frames(self, sequence, workers):
+        """
+        Check every frame of an EXR sequence is complete, reading only their
+        headers and offset tables.
+
+        :param sequence: The frame sequence to check.
+        :type sequence: `tk_katana.FrameSequence`
+        :param int workers: Number of frames checked at once.
+        :raises sgtk.TankError: If any frame is empty, truncated, or has a
+            different data window than the others.
+        """
+        exr = sgtk.platform.current_engine().import_module("tk_katana").exr
+        problems = exr.check_frames(sequence.paths, workers=workers)
+        if not problems:
+            return
+        for path, problem in sorted(problems.items()):
+            self.logger.error("'{}': {}".format(os.path.basename(path), problem))
+        raise sgtk.TankError(
+            "{} of {} frames of '{}' are invalid".format(
+                len(problems), len(sequence.frames), sequence.path)
+        )
+
+    def _get_render_metadata(self, path):
+        """
+        Get the channels, resolution and compression of a render, read from
+        the header of its first frame and cached until that frame changes.
+
+        :param path: The render sequence path.
+        :returns: The metadata, or None if it isn't an EXR sequence on disk.
+        :rtype: dict
+        """
+        return _get_render_metadata(path, self._get_sequence_scanner())
+
+    def _get_sequence_scanner(self):
+        """
+        Get the frame sequence scanner of this plugin, shared by all the render
+        items so that each render folder is only listed once.
+
+        :rtype: `tk_katana.SequenceScanner`
+        """
+        scanner = getattr(self, "_sequence_scanner", None)
+        if scanner is None:
+            tk_katana = sgtk.platform.current_engine().import_module("tk_katana")
+            scanner = self._sequence_scanner = tk_katana.SequenceScanner()
+        return scanner
+
     def _get_sequence_paths(self, item):
         """
         Get the individual paths to the image sequence
@@ -422,21 +589,79 @@ class KatanaRenderPublishPlugin(HookBaseClass):
         :param item: Item to process
         :returns: `list` of file paths
         """
-        collector = item.properties["__collector"]
-        path = item.properties.path
-        folder = os.path.dirname(path)
-        publisher = collector.parent
-
-        # get the pad string from this path, incase it has been changed.
-        frame_pattern_match = re.search(r".*[._-](.+)\.[^.]+$", path, re.IGNORECASE)
-        pad_str = None
-        if frame_pattern_match:
-            pad_str = frame_pattern_match.group(1)
-        
-        img_sequences = publisher.util.get_frame_sequences(folder, ["exr"], pad_str)
-        for image_seq_path, img_seq_files in img_sequences:
-            if image_seq_path == path:
-                return img_seq_files
+        sequence = self._get_sequence_scanner().find(item.properties.path)
+        if sequence is not None:
+            return sequence.paths
+
+    def _copy_work_to_publish(self, settings, item):
+        """
+        Copy the frames of the render to the publish area, several at once.
+
+        Overrides the base implementation, which copies one frame after the
+        other. Frames are cloned or hard linked instead of copied when
+        possible. The frames published are recorded in a manifest next to
+        them, with their checksums computed while copying, so publishing
+        again after a failure only transfers the frames missing or changed.
+
+        :param settings: Dictionary of Settings.
+        :param item: Item to process
+        """
+        work_template = item.properties.get("work_template")
+        publish_template = self.get_publish_template(settings, item)
+        if not work_template or not publish_template:
+            return super(KatanaRenderPublishPlugin, self)._copy_work_to_publish(
+                settings, item)
+
+        work_files = item.properties.get("sequence_paths") or [item.properties.path]
+        pairs = []
+        for work_file in work_files:
+            work_fields = work_template.validate_and_get_fields(work_file)
+            if not work_fields:
+                # Skipping it would register a publish missing frames
+                raise sgtk.TankError(
+                    "Work file '{}' did not match work template '{}'.".format(
+                        work_file, work_template)
+                )
+            pairs.append((work_file, publish_template.apply_fields(work_fields)))
+
+        engine = sgtk.platform.current_engine()
+        for publish_folder in set(os.path.dirname(publish_file) for _, publish_file in pairs):
+            engine.ensure_folder_exists(publish_folder)
+
+        tk_katana = engine.import_module("tk_katana")
+        total = len(pairs)
+        # Report about every 10%, as the UI shows each message
+        report_every = max(1, total // 10)
+
+        def report_progress(done, total):
+            if done == total or not done % report_every:
+                self.logger.info("Published {}/{} frames".format(done, total))
+
+        checksums = {}
+        try:
+            counts = tk_katana.transfer_files(
+                pairs,
+                workers=settings["copy_workers"].value,
+                hardlink=settings["hardlink_frames"].value,
+                progress=report_progress,
+                resume=True,
+                compare_checksums=settings["verify_checksums"].value,
+                checksums=checksums,
+            )
+        except tk_katana.TransferError as e:
+            raise sgtk.TankError(str(e))
+        # Also recorded in the manifest next to the frames, for loaders to verify
+        item.properties["checksums"] = checksums
+        if counts["skipped"]:
+            self.logger.info(
+                "Resumed publish, {} frames were already published".format(counts["skipped"])
+            )
+        methods = ", ".join(
+            "{} {}".format(count, method) for method, count in sorted(counts.items()) if count
+        )
+        self.logger.debug(
+            "Published {} frames to '{}': {}".format(total, publish_template.name, methods)
+        )
 
     def create_settings_widget(self, parent):
         """
@@ -523,3 +748,21 @@ class KatanaRenderPublishPlugin(HookBaseClass):
             node_settings = setting.get("node_settings", {})
             data = node_settings.get(node_name, {})
             widget.addItem(node_name, data)
+
+
+def _get_render_metadata(path, scanner):
+    """
+    Get the channels, resolution and compression of a render from the
+    engine's metadata cache, read from the header of its first frame.
+
+    :param path: The render sequence path.
+    :param scanner: The frame sequence scanner to find the frames with.
+    :type scanner: `tk_katana.SequenceScanner`
+    :returns: The metadata, or None if it isn't an EXR sequence on disk.
+    :rtype: dict
+    """
+    sequence = scanner.find(path)
+    if sequence is None or not sequence.frames or sequence.suffix.lower() != ".exr":
+        return None
+    engine = sgtk.platform.current_engine()
+    return engine.render_metadata_cache.get(sequence.path, sequence.paths[0])
@@ -261,14 +261,10 @@ class KatanaSessionPublishPlugin(HookBaseClass):
         # check to see if the next version of the work file already exists on
         # disk. if so, warn the user and provide the ability to jump to save
         # to that version now
-        (next_version_path, version) = self._get_next_version_info(path, item)
-        if next_version_path and os.path.exists(next_version_path):
-
-            # determine the next available version_number. just keep asking for
-            # the next one until we get one that doesn't exist.
-            while os.path.exists(next_version_path):
-                (next_version_path, version) = self._get_next_version_info(
-                    next_version_path, item)
+        (next_version_path, next_version) = self._get_next_version_info(
+            path, item)
+        (free_version_path, version) = self._get_next_free_version(path, item)
+        if next_version_path and version != next_version:
 
             error_msg = "The next version of this file already exists on disk."
             self.logger.error(
@@ -278,7 +274,7 @@ class KatanaSessionPublishPlugin(HookBaseClass):
                         "label": "Save to v%s" % (version,),
                         "tooltip": "Save to the next available version number, "
                                    "v%s" % (version,),
-                        "callback": lambda: _save_session(next_version_path)
+                        "callback": lambda: _save_session(free_version_path)
                     }
                 }
             )
@@ -320,10 +316,6 @@ class KatanaSessionPublishPlugin(HookBaseClass):
         # update the item with the saved session path
         item.properties["path"] = path
 
-        # add dependencies for the base class to register when publishing
-        item.properties["publish_dependencies"] = \
-            _katana_find_additional_session_dependencies()
-
         # Unfortunately, it seems that the SSL certificate does not work
         # with the Katana urlib2 library so we force it here
         ssl_cert_file = os.environ.get("SSL_CERT_FILE")
@@ -338,6 +330,11 @@ class KatanaSessionPublishPlugin(HookBaseClass):
         except ImportError:
             pass
 
+        # add dependencies for the base class to register when publishing,
+        # found with a Shotgun query so only once the certificates are set
+        item.properties["publish_dependencies"] = \
+            _katana_find_additional_session_dependencies()
+
         # let the base class register the publish
         super(KatanaSessionPublishPlugin, self).publish(settings, item)
 
@@ -360,19 +357,78 @@ class KatanaSessionPublishPlugin(HookBaseClass):
         # do the base class finalization
         super(KatanaSessionPublishPlugin, self).finalize(settings, item)
 
-        # bump the session file to the next version
-        self._save_to_next_version(item.properties["path"], item, _save_session)
+        # bump the session file to the next version not on disk
+        (next_version_path, version) = self._get_next_free_version(
+            item.properties["path"], item)
+        if not next_version_path:
+            self.logger.debug(
+                "No version number detected in the session path. Skipping "
+                "the version up.")
+            return
+
+        _save_session(next_version_path)
+        self.logger.info("Session saved as v%s: %s" % (version, next_version_path))
+
+    def _get_next_free_version(self, path, item):
+        """
+        Get the first version of the session file after the current one
+        which isn't on disk.
+
+        With a work template, the versions are looked up in an index built by
+        listing the work folder once, instead of checking every version on
+        disk. Otherwise the folder of the next version is listed once and the
+        versions looked up in that listing.
+
+        :param path: The session path.
+        :param item: Item to process.
+        :returns: The path and number of the version, or (None, None) if the
+            path has no version number.
+        """
+        tk_katana = self.parent.engine.import_module("tk_katana")
+
+        work_template = item.properties.get("work_template")
+        if work_template and work_template.validate(path):
+            fields = work_template.get_fields(path)
+            if "version" in fields:
+                versions = tk_katana.VersionIndex(work_template, fields)
+                version = versions.next_version(fields["version"])
+                return versions.get_path(version), version
+
+        (next_version_path, version) = self._get_next_version_info(path, item)
+        if not next_version_path:
+            return None, None
+        names = set(tk_katana.iter_names(os.path.dirname(next_version_path)))
+        while os.path.basename(next_version_path) in names:
+            (next_version_path, version) = self._get_next_version_info(
+                next_version_path, item)
+        return next_version_path, version
 
 
 def _katana_find_additional_session_dependencies():
     """
-    Find additional dependencies from the session
-    """
-    # Figure out what read nodes are known to the engine and use them
-    # as dependencies
-
+    Find additional dependencies from the session: the published files
+    referenced by the scene's nodes.
 
-    return []
+    The nodes are walked once, and all the paths found are looked up in
+    Shotgun with a single query.
+    """
+    engine = sgtk.platform.current_engine()
+    tk_katana = engine.import_module("tk_katana")
+    try:
+        paths = tk_katana.find_session_dependencies(engine.scene_index)
+        if not paths:
+            return []
+        publishes = sgtk.util.find_publish(engine.sgtk, paths)
+    except Exception as e:
+        # Dependencies are informative, never fail the publish for them
+        engine.logger.warning(
+            "Failed to find the session's dependencies: {}".format(e))
+        return []
+    engine.logger.debug(
+        "{} of the {} files referenced by the session are published".format(
+            len(publishes), len(paths))
+    )
+    return sorted(publishes)
 
 
 def _session_path():
@@ -179,6 +179,9 @@ class KatanaStartVersionControlPlugin(HookBaseClass):
 
         # get the path to a versioned copy of the file.
         version_path = publisher.util.get_version_path(path, "v001")
+        # A single stat is enough here: only v001 is checked, there are no
+        # versions to probe, and the session path has no version for a
+        # tk_katana.VersionIndex of the work template to be built from
         if os.path.exists(version_path):
             error_msg = "A file already exists with a version number. Please " \
                         "choose another name."
@@ -13,7 +13,20 @@ from Katana import Configuration
 from Katana import FarmAPI
 from Katana import Callbacks
 
+from . import exr
+from .asset_prefetch import prefetch_scene_assets
+from .lookfile_bake import bake_look_files, bake_scene_look_files
+from .lookfile_dependencies import find_referenced_paths
 from .menu_generation import MenuGenerator
+from .publish_batch import PublishBatch, defer_publish, finalize_publish
+from .render_outputs import RenderOutputIndex
+from .scene_index import SceneIndex
+from .session_dependencies import find_session_dependencies
+from .sequences import SequenceScanner, compact_frame_ranges, format_frame_ranges
+from .transfer import (
+    ContentIndex, PublishManifest, TransferError, transfer_deduplicated, transfer_files,
+)
+from .version_index import VersionIndex, iter_names
 
 
 def __show_tank_message(title, msg):
@@ -137,6 +150,27 @@ def __tank_on_scene_event_callback(**kwargs):
         __create_tank_error_menu()
 
 
+def __prefetch_assets_on_scene_load_callback(**kwargs):
+    """
+    Callback resolving all the scene's asset IDs right after it is loaded,
+    if enabled by the engine's ``prefetch_assets_on_scene_load`` setting.
+    """
+    engine = sgtk.platform.current_engine()
+    if not engine or not engine.get_setting("prefetch_assets_on_scene_load", False):
+        return
+
+    try:
+        prefetch_scene_assets(
+            engine.logger,
+            workers=engine.get_setting("asset_prefetch_workers", 8),
+        )
+    except Exception:
+        engine.logger.error(
+            "Failed to prefetch scene assets\n%s",
+            traceback.format_exc(),
+        )
+
+
 g_tank_callbacks_registered = False
 
 def tank_ensure_callbacks_registered():
@@ -147,4 +181,6 @@ def tank_ensure_callbacks_registered():
     if not g_tank_callbacks_registered:
         Callbacks.addCallback(Callbacks.Type.onSceneLoad, __tank_on_scene_event_callback) # onSceneAboutToLoad ?
         Callbacks.addCallback(Callbacks.Type.onSceneSave, __tank_on_scene_event_callback)
+        # Registered after the context callback so the right engine is running
+        Callbacks.addCallback(Callbacks.Type.onSceneLoad, __prefetch_assets_on_scene_load_callback)
         g_tank_callbacks_registered = True
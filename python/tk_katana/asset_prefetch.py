@@ -0,0 +1,85 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Warm the Shotgun asset plug-in's caches as soon as a scene is loaded.
+"""
+from Katana import NodegraphAPI
+
+
+# Parameter types holding other parameters rather than a value
+CONTAINER_PARAMETER_TYPES = ("group", "stringArray", "numberArray")
+
+
+def iter_string_values(nodes):
+    """
+    Yield the current value of every string parameter of the given nodes.
+
+    The parameters are walked with an explicit stack so deeply nested
+    groups never hit the recursion limit.
+
+    :param nodes: Katana nodes to inspect.
+    :type nodes: list
+    :rtype: generator[str]
+    """
+    for node in nodes:
+        stack = [node.getParameters()]
+        while stack:
+            parameter = stack.pop()
+            if parameter is None:
+                continue
+            parameter_type = parameter.getType()
+            if parameter_type in CONTAINER_PARAMETER_TYPES:
+                stack.extend(parameter.getChildren())
+            elif parameter_type == "string":
+                value = parameter.getValue(0)
+                if value:
+                    yield value
+
+
+def collect_asset_ids(asset_plugin, nodes=None):
+    """
+    Collect the unique asset IDs used by string parameters in the scene.
+
+    :param asset_plugin: The Shotgun asset plug-in instance.
+    :param nodes: Nodes to inspect, all the nodes of the scene by default.
+    :type nodes: list
+    :rtype: set[str]
+    """
+    if nodes is None:
+        nodes = NodegraphAPI.GetAllNodes()
+    return set(
+        value for value in iter_string_values(nodes)
+        if asset_plugin.isAssetId(value)
+    )
+
+
+def prefetch_scene_assets(logger, workers=8):
+    """
+    Resolve all the asset IDs of the current scene in a thread pool.
+
+    Does nothing if the Shotgun asset plug-in is not loaded.
+
+    :param logger: Logger to report progress to.
+    :param workers: Maximum number of threads resolving at once.
+    :type workers: int
+    :returns: Number of asset IDs resolved.
+    :rtype: int
+    """
+    try:
+        # Made importable by the plug-in once Katana has loaded it
+        import ShotgunAssetPlugin
+    except ImportError:
+        logger.debug("Shotgun asset plug-in not loaded, skipping prefetch.")
+        return 0
+
+    asset_plugin = ShotgunAssetPlugin.getPlugin()
+    asset_ids = collect_asset_ids(asset_plugin)
+    if not asset_ids:
+        return 0
+
+    logger.debug("Prefetching %d asset ID(s)...", len(asset_ids))
+    resolved = asset_plugin.prefetch(asset_ids, workers=workers)
+    logger.debug("Prefetched %d/%d asset ID(s).", resolved, len(asset_ids))
+    return resolved
@@ -0,0 +1,481 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Read OpenEXR headers and check frames are complete without reading their
+pixels, in pure Python.
+
+Only the header, the offset table and the header of the last chunk of each
+file are read: the offset table is written when the file is closed, so
+frames from killed renders are left with missing offsets or a last chunk
+running past the end of the file.
+"""
+import collections
+import math
+import os
+import struct
+import threading
+from multiprocessing.pool import ThreadPool
+
+
+MAGIC = b"\x76\x2f\x31\x01"
+
+# Version field flags
+TILED_FLAG = 0x200
+NON_IMAGE_FLAG = 0x800
+MULTIPART_FLAG = 0x1000
+
+COMPRESSIONS = (
+    "none", "rle", "zips", "zip", "piz", "pxr24", "b44", "b44a", "dwaa", "dwab",
+)
+
+# Scanlines per chunk, by compression
+SCANLINES_PER_CHUNK = {
+    "none": 1, "rle": 1, "zips": 1, "zip": 16, "piz": 32, "pxr24": 16,
+    "b44": 32, "b44a": 32, "dwaa": 32, "dwab": 256,
+}
+
+PIXEL_TYPES = ("uint", "half", "float")
+
+# Tile level modes and rounding modes
+ONE_LEVEL, MIPMAP_LEVELS, RIPMAP_LEVELS = 0, 1, 2
+ROUND_DOWN, ROUND_UP = 0, 1
+
+
+class ExrError(Exception):
+    """
+    Raised when a file isn't a complete OpenEXR file.
+    """
+
+
+Channel = collections.namedtuple("Channel", "name pixel_type x_sampling y_sampling")
+
+
+class ExrPart(object):
+    """
+    The header of one part of an OpenEXR file.
+    """
+    def __init__(self, attributes, tiled, deep, multipart=False):
+        """
+        :param attributes: Attribute name to its ``(type, value)``.
+        :param bool tiled: Whether the part is tiled.
+        :param bool deep: Whether the part holds deep data.
+        :param bool multipart: Whether the part belongs to a multi-part file.
+        """
+        self.attributes = attributes
+        self.tiled = tiled
+        self.deep = deep
+        self.multipart = multipart
+
+    def _get(self, name, default=None):
+        attribute = self.attributes.get(name)
+        return attribute[1] if attribute else default
+
+    @property
+    def channels(self):
+        """
+        The channels, sorted by name.
+
+        :rtype: list[Channel]
+        """
+        return self._get("channels", [])
+
+    @property
+    def compression(self):
+        """
+        The compression name, e.g. ``"zip"``.
+
+        :rtype: str
+        """
+        return self._get("compression", "none")
+
+    @property
+    def data_window(self):
+        """
+        ``(x_min, y_min, x_max, y_max)``, inclusive.
+
+        :rtype: tuple[int, int, int, int]
+        """
+        return self._get("dataWindow")
+
+    @property
+    def display_window(self):
+        """
+        ``(x_min, y_min, x_max, y_max)``, inclusive.
+
+        :rtype: tuple[int, int, int, int]
+        """
+        return self._get("displayWindow")
+
+    @property
+    def resolution(self):
+        """
+        Width and height of the display window.
+
+        :rtype: tuple[int, int]
+        """
+        x_min, y_min, x_max, y_max = self.display_window or self.data_window
+        return x_max - x_min + 1, y_max - y_min + 1
+
+    @property
+    def chunk_count(self):
+        """
+        Number of chunks, so of entries of the part's offset table.
+
+        :rtype: int
+        """
+        chunk_count = self._get("chunkCount")
+        if chunk_count is not None:
+            return chunk_count
+        x_min, y_min, x_max, y_max = self.data_window
+        width, height = x_max - x_min + 1, y_max - y_min + 1
+        if not self.tiled:
+            lines = 1 if self.deep else SCANLINES_PER_CHUNK.get(self.compression, 1)
+            return _ceil_div(height, lines)
+        return _tile_count(width, height, *self._get("tiles"))
+
+
+def _ceil_div(value, divisor):
+    return -(-value // divisor)
+
+
+def _level_count(size, rounding_mode):
+    if rounding_mode == ROUND_UP:
+        return int(math.ceil(math.log(size, 2))) + 1 if size > 1 else 1
+    return size.bit_length()
+
+
+def _level_size(size, level, rounding_mode):
+    if rounding_mode == ROUND_UP:
+        return max(_ceil_div(size, 1 << level), 1)
+    return max(size >> level, 1)
+
+
+def _tile_count(width, height, tile_width, tile_height, level_mode, rounding_mode):
+    """
+    Number of tiles of all the levels of a tiled part.
+    """
+    if level_mode == ONE_LEVEL:
+        x_levels, y_levels = [0], [0]
+    elif level_mode == MIPMAP_LEVELS:
+        levels = _level_count(max(width, height), rounding_mode)
+        x_levels = y_levels = range(levels)
+    else:
+        x_levels = range(_level_count(width, rounding_mode))
+        y_levels = range(_level_count(height, rounding_mode))
+
+    if level_mode == MIPMAP_LEVELS:
+        pairs = [(level, level) for level in x_levels]
+    else:
+        pairs = [(x_level, y_level) for y_level in y_levels for x_level in x_levels]
+    return sum(
+        _ceil_div(_level_size(width, x_level, rounding_mode), tile_width)
+        * _ceil_div(_level_size(height, y_level, rounding_mode), tile_height)
+        for x_level, y_level in pairs
+    )
+
+
+class _Reader(object):
+    """
+    Reads from a file, raising :class:`ExrError` on short reads.
+    """
+    def __init__(self, handle):
+        self.handle = handle
+
+    def read(self, size):
+        data = self.handle.read(size)
+        if len(data) != size:
+            raise ExrError("truncated at byte %d" % self.handle.tell())
+        return data
+
+    def unpack(self, fmt):
+        return struct.unpack(fmt, self.read(struct.calcsize(fmt)))
+
+    def read_string(self, limit=256):
+        """
+        Read a null-terminated string.
+        """
+        chars = []
+        while True:
+            char = self.read(1)
+            if char == b"\0":
+                return b"".join(chars).decode("latin-1")
+            chars.append(char)
+            if len(chars) > limit:
+                raise ExrError("invalid header, name too long")
+
+
+def _parse_channels(data):
+    channels = []
+    index = 0
+    while index < len(data) and data[index:index + 1] != b"\0":
+        end = data.index(b"\0", index)
+        name = data[index:end].decode("latin-1")
+        pixel_type, _, x_sampling, y_sampling = struct.unpack_from("<iB3xii", data, end + 1)
+        channels.append(Channel(
+            name,
+            PIXEL_TYPES[pixel_type] if 0 <= pixel_type < len(PIXEL_TYPES) else pixel_type,
+            x_sampling, y_sampling,
+        ))
+        index = end + 17
+    return channels
+
+
+def _parse_value(attribute_type, data):
+    """
+    Decode the attribute values needed to check a file, others are kept raw.
+    """
+    if attribute_type == "chlist":
+        return _parse_channels(data)
+    if attribute_type == "compression":
+        value = struct.unpack("<B", data)[0]
+        return COMPRESSIONS[value] if value < len(COMPRESSIONS) else value
+    if attribute_type == "box2i":
+        return struct.unpack("<4i", data)
+    if attribute_type == "int":
+        return struct.unpack("<i", data)[0]
+    if attribute_type == "tiledesc":
+        tile_width, tile_height, mode = struct.unpack("<IIB", data)
+        return tile_width, tile_height, mode & 0x0f, mode >> 4
+    if attribute_type == "string":
+        return data.decode("latin-1")
+    return data
+
+
+def _read_attributes(reader):
+    """
+    Read the attributes of a header, up to its terminating null byte.
+
+    :returns: The attributes, None if the header is empty: the end of the
+        headers of a multi-part file.
+    """
+    attributes = {}
+    while True:
+        name = reader.read_string()
+        if not name:
+            return attributes or None
+        attribute_type = reader.read_string()
+        size = reader.unpack("<i")[0]
+        if size < 0:
+            raise ExrError("invalid header, negative attribute size")
+        attributes[name] = (attribute_type, _parse_value(attribute_type, reader.read(size)))
+
+
+def _read_parts(reader):
+    """
+    Read the magic number, the version and the headers of all the parts.
+
+    :rtype: list[ExrPart]
+    """
+    if reader.read(4) != MAGIC:
+        raise ExrError("not an OpenEXR file")
+    version = reader.unpack("<I")[0]
+    tiled = bool(version & TILED_FLAG)
+    deep = bool(version & NON_IMAGE_FLAG)
+    if not version & MULTIPART_FLAG:
+        return [ExrPart(_read_attributes(reader) or {}, tiled, deep)]
+
+    parts = []
+    while True:
+        attributes = _read_attributes(reader)
+        if attributes is None:
+            break
+        part_type = attributes.get("type", (None, ""))[1]
+        parts.append(ExrPart(
+            attributes, "tiled" in part_type, part_type.startswith("deep"), multipart=True))
+    return parts
+
+
+def read_header(path):
+    """
+    Read the header of an OpenEXR file.
+
+    :param path: Path of the file.
+    :returns: The parts of the file, a single one unless it is multi-part.
+    :rtype: list[ExrPart]
+    :raises ExrError: If the header can't be read.
+    """
+    with open(path, "rb") as handle:
+        return _read_parts(_Reader(handle))
+
+
+def _chunk_end(reader, offset, part):
+    """
+    Read the header of the chunk at ``offset`` and get where the chunk ends.
+    """
+    reader.handle.seek(offset)
+    # Part number for multi-part files, then the tile or scanline coordinates
+    reader.unpack("<%s%s" % ("i" if part.multipart else "", "4i" if part.tiled else "i"))
+    if part.deep:
+        packed_offsets, packed_samples, _ = reader.unpack("<3q")
+        return reader.handle.tell() + packed_offsets + packed_samples
+    size = reader.unpack("<i")[0]
+    return reader.handle.tell() + size
+
+
+def check_frame(path):
+    """
+    Check an OpenEXR file is complete, reading only its header, its offset
+    table and the header of its last chunk.
+
+    :param path: Path of the file.
+    :returns: The parts of the file.
+    :rtype: list[ExrPart]
+    :raises ExrError: If the file is empty, truncated or isn't an OpenEXR
+        file.
+    """
+    try:
+        file_size = os.path.getsize(path)
+    except OSError as e:
+        raise ExrError(str(e))
+    if not file_size:
+        raise ExrError("zero-length file")
+
+    with open(path, "rb") as handle:
+        reader = _Reader(handle)
+        parts = _read_parts(reader)
+        tables = []
+        for part in parts:
+            if part.data_window is None:
+                raise ExrError("invalid header, no dataWindow")
+            count = part.chunk_count
+            tables.append(reader.unpack("<%dQ" % count) if count else ())
+
+        # Offsets are only filled in once the file is closed
+        missing = sum(1 for table in tables for offset in table if not offset)
+        if missing:
+            raise ExrError("incomplete, %d chunk(s) never written" % missing)
+        last_offset, last_part = max(
+            (max(table), part) for table, part in zip(tables, parts) if table)
+        if last_offset >= file_size:
+            raise ExrError("truncated, chunk at byte %d past the end" % last_offset)
+        end = _chunk_end(reader, last_offset, last_part)
+        if end > file_size:
+            raise ExrError("truncated, %d of %d bytes" % (file_size, end))
+    return parts
+
+
+def check_frames(paths, workers=8):
+    """
+    Check many OpenEXR files in parallel.
+
+    Besides incomplete files, frames whose data window differs from the
+    one of most of the frames are reported.
+
+    :param paths: Paths of the files.
+    :type paths: list[str]
+    :param workers: Maximum number of files checked at once.
+    :type workers: int
+    :returns: The problem of every invalid file, by path.
+    :rtype: dict[str, str]
+    """
+    paths = list(paths)
+    if not paths:
+        return {}
+
+    def check(path):
+        try:
+            return path, check_frame(path)[0].data_window, None
+        except (ExrError, IOError, OSError, struct.error) as e:
+            return path, None, str(e) or e.__class__.__name__
+
+    pool = ThreadPool(max(1, min(workers, len(paths))))
+    try:
+        results = pool.map(check, paths)
+    finally:
+        pool.close()
+        pool.join()
+
+    problems = dict((path, problem) for path, _, problem in results if problem)
+    data_windows = collections.Counter(
+        data_window for _, data_window, _ in results if data_window)
+    if len(data_windows) > 1:
+        expected = data_windows.most_common(1)[0][0]
+        for path, data_window, _ in results:
+            if data_window and data_window != expected:
+                problems[path] = "dataWindow %s instead of %s" % (
+                    data_window, expected)
+    return problems
+
+
+def read_metadata(path):
+    """
+    Read the facts about an OpenEXR file useful to describe a render output.
+
+    :param path: Path of the file.
+    :returns: Its ``channels`` names, ``resolution``, ``compression``,
+        ``data_window`` and number of ``parts``.
+    :rtype: dict
+    :raises ExrError: If the header can't be read.
+    """
+    parts = read_header(path)
+    part = parts[0]
+    return {
+        "channels": [
+            channel.name for part in parts for channel in part.channels
+        ],
+        "resolution": list(part.resolution),
+        "compression": part.compression,
+        "data_window": list(part.data_window),
+        "parts": len(parts),
+    }
+
+
+def format_metadata(metadata):
+    """
+    Summarize metadata from :func:`read_metadata`, e.g.
+    ``"1920x1080, zip, 4 channels: A, B, G, R"``.
+
+    :rtype: str
+    """
+    channels = metadata["channels"]
+    return "{}x{}, {}, {} channels: {}".format(
+        metadata["resolution"][0], metadata["resolution"][1],
+        metadata["compression"], len(channels), ", ".join(channels),
+    )
+
+
+class MetadataCache(object):
+    """
+    Metadata of render sequences, read from the header of one of their
+    frames and kept for as long as the frame's modification time doesn't
+    change.
+    """
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, sequence_path, frame_path):
+        """
+        Get the metadata of a sequence.
+
+        :param sequence_path: The sequence path, the cache key.
+        :param frame_path: The frame representative of the sequence.
+        :returns: The metadata, see :func:`read_metadata`, or None if the
+            frame can't be read.
+        :rtype: dict
+        """
+        try:
+            stat = os.stat(frame_path)
+        except OSError:
+            return None
+        key = (frame_path, stat.st_mtime, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(sequence_path)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        try:
+            metadata = read_metadata(frame_path)
+        except (ExrError, IOError, OSError, struct.error):
+            metadata = None
+        with self._lock:
+            self._entries[sequence_path] = (key, metadata)
+        return metadata
+
+    def clear(self):
+        """
+        Forget all the metadata read.
+        """
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,252 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Bake many LookFileBake nodes at once, each in its own Katana batch process.
+"""
+import os
+import shlex
+import subprocess
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from Katana import FarmAPI, KatanaFile
+
+
+# Replaces the configured bake command, e.g. with a local stand-in for testing
+BAKE_COMMAND_ENV = "SGTK_KATANA_BAKE_COMMAND"
+
+DEFAULT_BAKE_COMMAND = ["{katana}", "--batch", "--katana-file={scene}", "--render-node={node}"]
+
+# The thread running the bakes started from the engine command, if any
+_bake_thread = None
+
+
+class BakeResult(object):
+    """
+    The outcome of baking one node.
+    """
+    def __init__(self, node_name, output_path):
+        """
+        :param str node_name: Name of the LookFileBake node.
+        :param str output_path: The look file the node bakes to.
+        """
+        self.node_name = node_name
+        self.output_path = output_path
+        self.returncode = None
+        self.log = ""
+        self.started = None
+        self.seconds = 0.0
+
+    @property
+    def succeeded(self):
+        """
+        Whether the process succeeded and wrote the look file.
+
+        :rtype: bool
+        """
+        if self.returncode != 0:
+            return False
+        try:
+            # Allow for filesystems storing times to the second
+            return os.path.getmtime(self.output_path) >= int(self.started)
+        except OSError:
+            return False
+
+
+def get_katana_executable():
+    """
+    Get the Katana launcher of the running installation.
+
+    :rtype: str
+    """
+    katana_root = os.environ.get("KATANA_ROOT")
+    if katana_root:
+        return os.path.join(katana_root, "katana")
+    return "katana"
+
+
+def get_bake_command(command=None):
+    """
+    Get the bake command, as arguments with ``{katana}``, ``{scene}``,
+    ``{node}`` and ``{output}`` placeholders.
+
+    :param command: The configured command, the default one if None.
+    :type command: list[str]
+    :returns: The command from :data:`BAKE_COMMAND_ENV` if set, else the
+        configured one.
+    :rtype: list[str]
+    """
+    override = os.environ.get(BAKE_COMMAND_ENV)
+    if override:
+        return shlex.split(override)
+    return list(command or DEFAULT_BAKE_COMMAND)
+
+
+def find_bake_nodes(scene_index):
+    """
+    Get the LookFileBake nodes of the scene set up by Shotgun.
+
+    :param scene_index: The scene index.
+    :type scene_index: SceneIndex
+    :returns: The node names and the look files they bake to.
+    :rtype: list[tuple[str, str]]
+    """
+    nodes = []
+    for node in scene_index.get_nodes_by_type("LookFileBake"):
+        name = node.getName()
+        output_path = scene_index.get_parameter_values(name).get("sg_saveTo")
+        if output_path:
+            nodes.append((name, output_path))
+    return sorted(nodes)
+
+
+def get_scene_to_bake(save=True):
+    """
+    Get the scene the bake processes load: the current session, saved first
+    if it has unsaved changes.
+
+    :param bool save: Whether to save unsaved changes, else they are ignored.
+    :returns: The scene path, or None if the session was never saved.
+    :rtype: str
+    """
+    scene = FarmAPI.GetKatanaFileName()
+    if not scene:
+        return None
+    if save and KatanaFile.IsFileDirty():
+        KatanaFile.Save(scene)
+    return scene
+
+
+def bake_look_files(scene, nodes, command=None, workers=4, logger=None):
+    """
+    Bake LookFileBake nodes, running up to ``workers`` batch processes at
+    once.
+
+    :param str scene: The Katana scene the processes load.
+    :param nodes: Names of the nodes and the look files they bake to.
+    :type nodes: list[tuple[str, str]]
+    :param command: The bake command, see :func:`get_bake_command`.
+    :type command: list[str]
+    :param int workers: Maximum number of processes running at once.
+    :param logger: Optional logger to report progress to.
+    :returns: The result of every node, in the given order.
+    :rtype: list[BakeResult]
+    """
+    command = get_bake_command(command)
+    katana = get_katana_executable()
+
+    def bake(node):
+        node_name, output_path = node
+        result = BakeResult(node_name, output_path)
+        arguments = [
+            argument.format(katana=katana, scene=scene, node=node_name, output=output_path)
+            for argument in command
+        ]
+        folder = os.path.dirname(output_path)
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                # Created by another process meanwhile
+                pass
+        result.started = time.time()
+        try:
+            process = subprocess.Popen(
+                arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            log = process.communicate()[0]
+            result.returncode = process.returncode
+            result.log = log.decode("utf-8", "replace") if isinstance(log, bytes) else log
+        except OSError as e:
+            result.log = "Failed to run {}: {}".format(arguments[0], e)
+        result.seconds = time.time() - result.started
+        if logger is not None:
+            if result.succeeded:
+                logger.info("Baked '{}' in {:.1f}s".format(node_name, result.seconds))
+            else:
+                logger.error("Failed to bake '{}':\n{}".format(node_name, result.log))
+        return result
+
+    nodes = list(nodes)
+    if not nodes:
+        return []
+    pool = ThreadPool(max(1, min(workers, len(nodes))))
+    try:
+        return pool.map(bake, nodes)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def bake_scene_look_files(engine):
+    """
+    Bake all the Shotgun LookFileBake nodes of the current scene in parallel,
+    then open the publisher so the look files can be published right away.
+
+    The scene is saved from the calling (main) thread, then the bakes are
+    scheduled from a background thread so Katana stays responsive. The
+    publisher is opened back on the main thread once they are all done.
+
+    Uses the engine's ``lookfile_bake_workers`` and ``lookfile_bake_command``
+    settings.
+
+    :param engine: The Katana engine.
+    :returns: The thread running the bakes, or None if nothing is baked.
+    :rtype: threading.Thread
+    """
+    global _bake_thread
+    if _bake_thread is not None and _bake_thread.is_alive():
+        engine.logger.warning("Look files are already being baked.")
+        return None
+
+    nodes = find_bake_nodes(engine.scene_index)
+    if not nodes:
+        engine.logger.warning("No Shotgun LookFileBake node to bake.")
+        return None
+    scene = get_scene_to_bake()
+    if not scene:
+        engine.logger.error("Save the scene before baking look files.")
+        return None
+
+    engine.logger.info("Baking {} look files from '{}'...".format(len(nodes), scene))
+    command = engine.get_setting("lookfile_bake_command", None)
+    workers = engine.get_setting("lookfile_bake_workers", 4)
+
+    def bake():
+        try:
+            results = bake_look_files(
+                scene, nodes, command=command, workers=workers, logger=engine.logger)
+        except Exception as e:
+            engine.logger.error("Failed to bake look files: {}".format(e))
+            return
+        engine.async_execute_in_main_thread(_on_look_files_baked, engine, results)
+
+    _bake_thread = threading.Thread(target=bake, name="LookFileBake")
+    _bake_thread.daemon = True
+    _bake_thread.start()
+    return _bake_thread
+
+
+def _on_look_files_baked(engine, results):
+    """
+    Report the bakes and open the publisher, from the main thread.
+
+    :param engine: The Katana engine.
+    :param results: The result of every node.
+    :type results: list[BakeResult]
+    """
+    failed = [result.node_name for result in results if not result.succeeded]
+    if failed:
+        engine.logger.error("Failed to bake: {}".format(", ".join(failed)))
+    else:
+        engine.logger.info("Baked {} look files.".format(len(results)))
+
+    # The publisher collects the baked look files from the nodes' sg_saveTo
+    if len(failed) < len(results):
+        for command in engine.commands.values():
+            app = command["properties"].get("app")
+            if app is not None and app.name == "tk-multi-publish2":
+                command["callback"]()
+                break
@@ -0,0 +1,117 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Find the files referenced by a baked look file, such as textures, reading
+it in blocks so even very large look files are never fully loaded.
+"""
+import os
+import re
+
+# Size of the blocks read from look files
+BLOCK_SIZE = 1024 * 1024
+
+# Printable text runs longer than this are split, bounding the memory used.
+# Paths are never longer than PATH_MAX
+MAX_RUN_SIZE = 4096
+
+# Runs of printable ASCII, in which paths are stored
+PRINTABLE_RUN_REGEX = re.compile(br"[\x20-\x7e]{5,}")
+
+# Tokens of a text run which may hold a path, split at whitespace, quotes
+# and list separators
+TOKEN_REGEX = re.compile(br"[^\s\"',;]+")
+
+# Start of an absolute path in a token
+PATH_START_REGEX = re.compile(br"(?:[A-Za-z]:)?[/\\]")
+
+# Absolute file paths with an extension, matched against a whole candidate.
+# Components can't hold separators, so matching never backtracks across them
+# and stays linear in the candidate's length
+PATH_REGEX = re.compile(
+    br"(?:[A-Za-z]:)?(?:[/\\][^/\\]+){2,}\.[A-Za-z0-9]{1,8}\Z"
+)
+
+# Punctuation left after a path, e.g. closing brackets
+TRAILING_PUNCTUATION = b")]}>:."
+
+# The last byte which isn't printable ASCII
+NON_PRINTABLE_TAIL_REGEX = re.compile(br"[^\x20-\x7e][\x20-\x7e]*\Z")
+
+
+def iter_text_runs(path, block_size=BLOCK_SIZE):
+    """
+    Yield the runs of printable text of a binary file, reading it in blocks.
+
+    Runs spanning two blocks are yielded whole.
+
+    :param str path: The file to read.
+    :param int block_size: Number of bytes read at once.
+    :rtype: generator[bytes]
+    """
+    carry = b""
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(block_size), b""):
+            data = carry + block
+            # Keep the trailing run for the next block, it may continue there
+            match = NON_PRINTABLE_TAIL_REGEX.search(data)
+            split = match.start() + 1 if match else 0
+            if len(data) - split > MAX_RUN_SIZE:
+                split = len(data)
+            carry = data[split:]
+            for run in PRINTABLE_RUN_REGEX.findall(data, 0, split):
+                yield run
+    if carry:
+        for run in PRINTABLE_RUN_REGEX.findall(carry):
+            yield run
+
+
+def iter_candidate_paths(run):
+    """
+    Yield the absolute file paths in a run of text.
+
+    Runs are split into tokens first, and each token is matched once from
+    its first separator, so long runs of separators stay cheap.
+
+    :param bytes run: A run of printable text.
+    :rtype: generator[bytes]
+    """
+    for token in TOKEN_REGEX.findall(run):
+        start = PATH_START_REGEX.search(token)
+        if start is None:
+            continue
+        candidate = token[start.start():].rstrip(TRAILING_PUNCTUATION)
+        if len(candidate) <= MAX_RUN_SIZE and PATH_REGEX.match(candidate):
+            yield candidate
+
+
+def find_referenced_paths(path, block_size=BLOCK_SIZE):
+    """
+    Find the file paths referenced by a look file.
+
+    Only paths whose folder exists are kept, leaving out scene graph
+    locations and other strings looking like paths.
+
+    :param str path: The look file.
+    :param int block_size: Number of bytes read at once.
+    :returns: The unique paths referenced, sorted.
+    :rtype: list[str]
+    """
+    candidates = set()
+    for run in iter_text_runs(path, block_size):
+        candidates.update(iter_candidate_paths(run))
+
+    look_file = os.path.normpath(path)
+    folders = {}
+    paths = []
+    for candidate in candidates:
+        candidate = candidate.decode("ascii")
+        if os.path.normpath(candidate) == look_file:
+            continue
+        folder = os.path.dirname(candidate)
+        if folder not in folders:
+            folders[folder] = os.path.isdir(folder)
+        if folders[folder]:
+            paths.append(candidate)
+    return sorted(paths)
@@ -0,0 +1,269 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Register the publishes of many publish items with a few Shotgun requests.
+"""
+import os
+
+import sgtk
+
+from .transfer import PublishManifest
+
+
+class PublishBatch(object):
+    """
+    Collects the PublishedFile registrations of the publish items during the
+    publish pass and sends them to Shotgun when the first of them is
+    finalized: all the PublishedFile entities in one batch request, then all
+    their dependencies and version links in another, whatever the number of
+    items.
+
+    One batch is shared by all the items of a publish tree, stored in the
+    properties of its root item.
+
+    The files of an item are copied before its publish is registered. Until
+    it is, the manifest of their folder is marked incomplete, so if the
+    publish fails before the batch is committed, the version is offered
+    again and publishing it resumes the copy then registers it.
+    """
+
+    # Property of the root item holding the batch
+    PROPERTY = "katana_publish_batch"
+
+    def __init__(self, tk, logger):
+        """
+        Initialize the batch.
+
+        :param tk: Toolkit API instance.
+        :param logger: Logger to report to.
+        """
+        self.tk = tk
+        self.logger = logger
+        self._pending = []
+        self._error = None
+
+    @classmethod
+    def for_item(cls, item, tk, logger):
+        """
+        Get the batch of an item's publish tree, creating it if needed.
+
+        :param item: A publish item.
+        :param tk: Toolkit API instance.
+        :param logger: Logger to report to.
+        :rtype: PublishBatch
+        """
+        root = item
+        while root.parent is not None:
+            root = root.parent
+        batch = root.properties.get(cls.PROPERTY)
+        if batch is None:
+            batch = root.properties[cls.PROPERTY] = cls(tk, logger)
+        return batch
+
+    def add(self, item, publish_data):
+        """
+        Buffer the registration of an item's publish, marking its published
+        files as pending.
+
+        :param item: The publish item, its ``sg_publish_data`` property is
+            set once the batch is committed.
+        :param publish_data: Keyword arguments for
+            ``sgtk.util.register_publish``.
+        :type publish_data: dict
+        """
+        _set_complete(os.path.dirname(publish_data["path"]), False)
+        self._pending.append((item, publish_data))
+
+    def commit(self):
+        """
+        Register all the buffered publishes. Does nothing if they already are.
+
+        :raises Exception: The Shotgun error if the registration failed, for
+            every item finalized afterwards too.
+        """
+        if self._error is not None:
+            raise self._error
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            self._register(pending)
+        except Exception as e:
+            self._error = e
+            self.logger.error(
+                "Registering {} publish(es) failed: {}".format(len(pending), e)
+            )
+            raise
+
+    def _register(self, pending):
+        shotgun = self.tk.shotgun
+        # register_publish looks the type up for every publish, even dry run
+        publish_types = get_published_file_types(shotgun, set(
+            publish_data.get("published_file_type") for _, publish_data in pending
+        ) - set([None]))
+        requests = []
+        for _, publish_data in pending:
+            publish_data = dict(publish_data)
+            for key in ("dependency_paths", "dependency_ids", "thumbnail_path"):
+                publish_data.pop(key, None)
+            publish_type = publish_data.pop("published_file_type", None)
+            data = sgtk.util.register_publish(dry_run=True, **publish_data)
+            if publish_type:
+                data["published_file_type"] = publish_types[publish_type]
+            requests.append({
+                "request_type": "create",
+                "entity_type": data.pop("type", "PublishedFile"),
+                "data": data,
+            })
+        entities = shotgun.batch(requests)
+        self.logger.debug(
+            "Registered {} publish(es) in a single Shotgun request.".format(len(entities))
+        )
+        # Registered, so never offered again even if what follows fails
+        for _, publish_data in pending:
+            _set_complete(os.path.dirname(publish_data["path"]), True)
+
+        # Resolve the dependency paths of all the items at once
+        dependency_paths = set(
+            path for _, publish_data in pending
+            for path in publish_data.get("dependency_paths") or []
+        )
+        dependencies = {}
+        if dependency_paths:
+            dependencies = sgtk.util.find_publish(self.tk, list(dependency_paths))
+
+        requests = []
+        for (item, publish_data), entity in zip(pending, entities):
+            item.properties.sg_publish_data = entity
+            publish = {"type": entity["type"], "id": entity["id"]}
+            dependency_ids = list(publish_data.get("dependency_ids") or [])
+            dependency_ids.extend(
+                dependencies[path]["id"]
+                for path in publish_data.get("dependency_paths") or []
+                if path in dependencies
+            )
+            for dependency_id in dependency_ids:
+                requests.append({
+                    "request_type": "create",
+                    "entity_type": "PublishedFileDependency",
+                    "data": {
+                        "published_file": publish,
+                        "dependent_published_file": {
+                            "type": entity["type"], "id": dependency_id,
+                        },
+                    },
+                })
+            # Versions created by the review submission while the publish
+            # didn't exist yet
+            version = item.properties.get("sg_version_data")
+            if version:
+                requests.append({
+                    "request_type": "update",
+                    "entity_type": "Version",
+                    "entity_id": version["id"],
+                    "data": {"published_files": [publish]},
+                })
+        if requests:
+            shotgun.batch(requests)
+
+        # Thumbnails can't be uploaded in a batch
+        for (_, publish_data), entity in zip(pending, entities):
+            thumbnail_path = publish_data.get("thumbnail_path")
+            if thumbnail_path:
+                shotgun.upload_thumbnail(entity["type"], entity["id"], thumbnail_path)
+
+
+def get_published_file_types(shotgun, codes):
+    """
+    Get PublishedFileType entities, creating the missing ones, with one
+    query for all of them.
+
+    :param shotgun: Shotgun API connection.
+    :param codes: Codes of the types, e.g. ``"Rendered Image"``.
+    :type codes: set[str]
+    :returns: The entities, by code.
+    :rtype: dict[str, dict]
+    """
+    if not codes:
+        return {}
+    publish_types = dict(
+        (entity["code"], {"type": entity["type"], "id": entity["id"]})
+        for entity in shotgun.find(
+            "PublishedFileType", [["code", "in", list(codes)]], ["code"])
+    )
+    missing = sorted(set(codes) - set(publish_types))
+    if missing:
+        created = shotgun.batch([
+            {"request_type": "create", "entity_type": "PublishedFileType",
+             "data": {"code": code}}
+            for code in missing
+        ])
+        for code, entity in zip(missing, created):
+            publish_types[code] = {"type": entity["type"], "id": entity["id"]}
+    return publish_types
+
+
+def _set_complete(folder, complete):
+    """
+    Mark the manifest of a publish folder complete or not. Files published
+    in place have no manifest and are left alone.
+
+    :param str folder: The folder of the published files.
+    :param bool complete: Whether the publish is complete.
+    """
+    manifest = PublishManifest(folder)
+    if os.path.exists(manifest.path) and manifest.complete != complete:
+        manifest.complete = complete
+        manifest.save()
+
+
+def defer_publish(plugin, settings, item):
+    """
+    Publish an item like the base ``publish_file`` hook does, except that
+    registering the publish is buffered in the item's :class:`PublishBatch`
+    until it is committed by :func:`finalize_publish`.
+
+    :param plugin: The publish plugin hook, deriving from ``publish_file``.
+    :param settings: Dictionary of Settings.
+    :param item: Item to process
+    """
+    publisher = plugin.parent
+    dependency_ids = []
+    if "sg_publish_data" in item.parent.properties:
+        dependency_ids.append(item.parent.properties.sg_publish_data["id"])
+    publish_data = {
+        "tk": publisher.sgtk,
+        "context": item.context,
+        "comment": item.description,
+        "path": plugin.get_publish_path(settings, item),
+        "name": plugin.get_publish_name(settings, item),
+        "created_by": plugin.get_publish_user(settings, item),
+        "version_number": plugin.get_publish_version(settings, item),
+        "thumbnail_path": item.get_thumbnail_as_path(),
+        "published_file_type": plugin.get_publish_type(settings, item),
+        "dependency_paths": plugin.get_publish_dependencies(settings, item),
+        "dependency_ids": dependency_ids,
+    }
+    # Only available with recent versions of the publisher
+    if hasattr(plugin, "get_publish_fields"):
+        publish_data["sg_fields"] = plugin.get_publish_fields(settings, item)
+    if hasattr(plugin, "get_publish_kwargs"):
+        publish_data.update(plugin.get_publish_kwargs(settings, item))
+
+    plugin._copy_work_to_publish(settings, item)
+
+    PublishBatch.for_item(item, publisher.sgtk, plugin.logger).add(item, publish_data)
+    plugin.logger.info("Publish queued, it will be registered when finalizing.")
+
+
+def finalize_publish(plugin, item):
+    """
+    Register all the publishes buffered by :func:`defer_publish` for the
+    item's publish tree, if not already done.
+
+    :param plugin: The publish plugin hook.
+    :param item: Item to process
+    """
+    PublishBatch.for_item(item, plugin.parent.sgtk, plugin.logger).commit()
@@ -0,0 +1,138 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Scene-wide index of the Render nodes' output locations.
+"""
+from Katana import NodegraphAPI, Utils
+
+
+class RenderOutputIndex(object):
+    """
+    Maps every output location of the scene's Render nodes to whether at
+    least one of them has it enabled.
+
+    The index is built on first use by walking the Render nodes once, then
+    shared by every publish item until a Render or RenderOutputDefine node
+    is created, deleted, renamed or has one of its parameters changed, or
+    any port is connected or disconnected, since the outputs of a Render
+    node depend on the nodes upstream of it.
+    """
+
+    # Nodegraph events which may change the render outputs
+    EVENT_TYPES = (
+        "node_create",
+        "node_delete",
+        "node_setName",
+        "node_setBypassed",
+        "parameter_setValue",
+        "parameter_finalizeValue",
+        "port_connect",
+        "port_disconnect",
+    )
+
+    # Types of the nodes defining the render outputs
+    NODE_TYPES = ("Render", "RenderOutputDefine")
+
+    def __init__(self, scene_index=None):
+        """
+        :param scene_index: Optional scene index to get the Render nodes from,
+            rather than walking the scene.
+        :type scene_index: SceneIndex
+        """
+        self._scene_index = scene_index
+        self._enabled_paths = None
+        self._registered = False
+
+    def register(self):
+        """
+        Start listening to the nodegraph events invalidating the index.
+        """
+        if self._registered:
+            return
+        for event_type in self.EVENT_TYPES:
+            Utils.EventModule.RegisterCollapsedHandler(
+                self._on_nodegraph_changed, event_type, None)
+        self._registered = True
+
+    def unregister(self):
+        """
+        Stop listening to the nodegraph events.
+        """
+        if not self._registered:
+            return
+        for event_type in self.EVENT_TYPES:
+            Utils.EventModule.UnregisterCollapsedHandler(
+                self._on_nodegraph_changed, event_type, None)
+        self._registered = False
+
+    def invalidate(self):
+        """
+        Discard the index, it will be rebuilt on its next use.
+        """
+        self._enabled_paths = None
+
+    def _on_nodegraph_changed(self, args):
+        """
+        Collapsed event handler, invalidating the index if any of the events
+        concerns a node defining render outputs, a group node which may hold
+        some, or a port connection.
+
+        :param args: List of ``(event_type, event_id, kwargs)``.
+        """
+        if self._enabled_paths is None:
+            return
+        for _, _, kwargs in args:
+            node = kwargs.get("node")
+            if (node is None or node.getType() in self.NODE_TYPES
+                    or (hasattr(node, "getChildren") and node.getChildren())):
+                self.invalidate()
+                return
+
+    @property
+    def enabled_paths(self):
+        """
+        Output location to enabled state of all the Render nodes.
+
+        :rtype: dict[str, bool]
+        """
+        if self._enabled_paths is None:
+            self._enabled_paths = self._build()
+        return self._enabled_paths
+
+    def _build(self):
+        """
+        Walk all the Render nodes and read their output parameters.
+
+        :rtype: dict[str, bool]
+        """
+        if self._scene_index is not None:
+            nodes = self._scene_index.get_nodes_by_type("Render")
+        else:
+            nodes = NodegraphAPI.GetAllNodesByType("Render")
+        enabled_paths = {}
+        for node in nodes:
+            outputs = node.getParameter("outputs")
+            locations = outputs.getChild("locations").getChildren()
+            enabled_flags = outputs.getChild("enabledFlags").getChildren()
+            for location, enabled in zip(locations, enabled_flags):
+                path = location.getValue(0)
+                # At least one enabled to make it enabled
+                enabled_paths[path] = (
+                    enabled_paths.get(path, False) or bool(enabled.getValue(0))
+                )
+        return enabled_paths
+
+    def __contains__(self, path):
+        return path in self.enabled_paths
+
+    def is_enabled(self, path):
+        """
+        Whether the output location is enabled in at least one Render node.
+
+        :param path: Output location.
+        :type path: str
+        :rtype: bool
+        """
+        return self.enabled_paths.get(path, False)
@@ -0,0 +1,187 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Scene-wide index of the nodes by type, kept up to date from nodegraph events.
+"""
+from Katana import NodegraphAPI, Utils
+
+
+class SceneIndex(object):
+    """
+    Maps node types to the scene's nodes, and caches the values of the
+    Shotgun parameters of the nodes that have them.
+
+    The index is built on first use by walking the scene once, then updated
+    from the nodegraph events as nodes are created, deleted, renamed or have
+    a Shotgun parameter changed, so publish hooks and loaders can query it
+    without walking the scene again.
+    """
+
+    # Parameters whose values are cached
+    PARAMETERS = ("sg_saveTo", "sg_work_template", "sg_publish_template")
+
+    # Nodegraph events updating the index
+    EVENT_TYPES = (
+        "node_create",
+        "node_delete",
+        "node_setName",
+        "parameter_setValue",
+        "parameter_finalizeValue",
+        "parameter_createChild",
+        "parameter_deleteChild",
+        "nodegraph_loadEnd",
+    )
+
+    def __init__(self):
+        self._nodes = None
+        self._types = None
+        self._parameters = None
+        self._registered = False
+
+    def register(self):
+        """
+        Start listening to the nodegraph events updating the index.
+        """
+        if self._registered:
+            return
+        for event_type in self.EVENT_TYPES:
+            Utils.EventModule.RegisterCollapsedHandler(
+                self._on_nodegraph_changed, event_type, None)
+        self._registered = True
+
+    def unregister(self):
+        """
+        Stop listening to the nodegraph events.
+        """
+        if not self._registered:
+            return
+        for event_type in self.EVENT_TYPES:
+            Utils.EventModule.UnregisterCollapsedHandler(
+                self._on_nodegraph_changed, event_type, None)
+        self._registered = False
+
+    def invalidate(self):
+        """
+        Discard the index, it will be rebuilt on its next use.
+        """
+        self._nodes = self._types = self._parameters = None
+
+    def _build(self):
+        """
+        Walk all the nodes of the scene.
+        """
+        self._nodes = {}
+        self._types = {}
+        self._parameters = {}
+        for node in NodegraphAPI.GetAllNodes():
+            self._add(node)
+
+    def _ensure_built(self):
+        if self._nodes is None:
+            self._build()
+
+    def _add(self, node):
+        name = node.getName()
+        self._nodes[name] = node
+        self._types.setdefault(node.getType(), {})[name] = node
+        self._read_parameters(node)
+
+    def _read_parameters(self, node):
+        name = node.getName()
+        parameters = {}
+        for parameter_name in self.PARAMETERS:
+            parameter = node.getParameter(parameter_name)
+            if parameter is not None:
+                parameters[parameter_name] = parameter.getValue(0)
+        if parameters:
+            self._parameters[name] = parameters
+        else:
+            self._parameters.pop(name, None)
+
+    def _remove(self, name):
+        node = self._nodes.pop(name, None)
+        self._parameters.pop(name, None)
+        for nodes in self._types.values():
+            if nodes.get(name) is node:
+                del nodes[name]
+
+    def _on_nodegraph_changed(self, args):
+        """
+        Collapsed event handler, updating the index from the events.
+
+        Events it can't apply incrementally, such as group nodes created or
+        deleted along with their children, or a scene being loaded, discard
+        the index instead.
+
+        :param args: List of ``(event_type, event_id, kwargs)``.
+        """
+        if self._nodes is None:
+            return
+        for event_type, _, kwargs in args:
+            if not self._apply(event_type, kwargs):
+                self.invalidate()
+                return
+
+    def _apply(self, event_type, kwargs):
+        """
+        Apply one event to the index.
+
+        :returns: False if the event can't be applied incrementally.
+        """
+        node = kwargs.get("node")
+        if event_type.startswith("parameter_"):
+            # Cheaper to read the few parameters again than to tell which
+            # parameter changed
+            if node is not None and self._nodes.get(node.getName()) is node:
+                self._read_parameters(node)
+            return True
+        if node is None:
+            return False
+        if hasattr(node, "getChildren") and node.getChildren():
+            return False
+        if event_type == "node_create":
+            self._add(node)
+        elif event_type == "node_delete":
+            self._remove(node.getName())
+        elif event_type == "node_setName":
+            old_name = kwargs.get("oldName")
+            if old_name is None:
+                return False
+            self._remove(old_name)
+            self._add(node)
+        else:
+            return False
+        return True
+
+    def get_node(self, name):
+        """
+        Get a node by name.
+
+        :param str name: Node name.
+        :returns: The node, or None.
+        """
+        self._ensure_built()
+        return self._nodes.get(name)
+
+    def get_nodes_by_type(self, node_type):
+        """
+        Get all the nodes of a type.
+
+        :param str node_type: Node type, e.g. ``"Render"``.
+        :rtype: list
+        """
+        self._ensure_built()
+        return list(self._types.get(node_type, {}).values())
+
+    def get_parameter_values(self, name):
+        """
+        Get the cached values of the Shotgun parameters of a node.
+
+        :param str name: Node name.
+        :returns: Values of the node's :attr:`PARAMETERS`, by parameter name.
+        :rtype: dict[str, str]
+        """
+        self._ensure_built()
+        return dict(self._parameters.get(name, {}))
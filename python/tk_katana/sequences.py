@@ -0,0 +1,225 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Detect frame sequences with a single folder listing and describe them as
+compact frame ranges.
+"""
+import os
+import re
+import time
+
+from .version_index import scandir
+
+
+# A concrete frame file: <prefix><frame><extension>, e.g. "beauty.1001.exr"
+FRAME_FILE_REGEX = re.compile(r"^(?P<prefix>.*?[._-])(?P<frame>-?\d+)(?P<suffix>\.[^.]+)$")
+
+# Folders modified more recently than this many seconds ago may still be
+# written to within the resolution of their modification time: not cached.
+SETTLE_SECONDS = 2
+
+# A sequence path: its frame number may also be "####", "%04d" or "@@@@"
+SEQUENCE_PATH_REGEX = re.compile(
+    r"^(?P<prefix>.*?[._-])(?P<frame>#+|@+|%0?\d*d|-?\d+)(?P<suffix>\.[^.]+)$")
+
+
+def compact_frame_ranges(frames):
+    """
+    Describe sorted frame numbers as ``(first, last, step)`` ranges.
+
+    :param frames: Sorted, unique frame numbers.
+    :type frames: list[int]
+    :rtype: list[tuple[int, int, int]]
+    """
+    ranges = []
+    index = 0
+    while index < len(frames):
+        first = frames[index]
+        if index + 1 == len(frames):
+            ranges.append((first, first, 1))
+            break
+        step = frames[index + 1] - first
+        last_index = index + 1
+        while (last_index + 1 < len(frames)
+               and frames[last_index + 1] - frames[last_index] == step):
+            last_index += 1
+        ranges.append((first, frames[last_index], step))
+        index = last_index + 1
+    return ranges
+
+
+def format_frame_ranges(ranges):
+    """
+    Format frame ranges as a string like ``"1001-1049x1,1051-1100x1"``.
+
+    :param ranges: ``(first, last, step)`` ranges.
+    :rtype: str
+    """
+    return ",".join(
+        str(first) if first == last else "%d-%dx%d" % (first, last, step)
+        for first, last, step in ranges
+    )
+
+
+class FrameSequence(object):
+    """
+    The frames found on disk for one sequence of a folder.
+    """
+    def __init__(self, folder, prefix, suffix, padding):
+        """
+        Initialize the sequence.
+
+        :param folder: Folder holding the frames.
+        :param prefix: File name before the frame number.
+        :param suffix: File name after the frame number, e.g. ".exr".
+        :param padding: Number of digits of the frame numbers.
+        """
+        self.folder = folder
+        self.prefix = prefix
+        self.suffix = suffix
+        self.padding = padding
+        self.frames = []
+        self._names = {}
+
+    def add(self, frame, name):
+        """
+        Add a frame found on disk, as named in the folder.
+        """
+        self._names[frame] = name
+
+    def finalize(self):
+        """
+        Sort the frames, once all of them have been added.
+        """
+        self.frames = sorted(self._names)
+
+    @property
+    def path(self):
+        """
+        The sequence path, with ``%0Nd`` standing for the frame number.
+
+        :rtype: str
+        """
+        return os.path.join(
+            self.folder, "%s%%0%dd%s" % (self.prefix, self.padding, self.suffix))
+
+    @property
+    def paths(self):
+        """
+        The file path of every frame, in frame order.
+
+        :rtype: list[str]
+        """
+        return [os.path.join(self.folder, self._names[frame]) for frame in self.frames]
+
+    @property
+    def step(self):
+        """
+        The smallest gap between two frames, 1 for a single frame.
+
+        :rtype: int
+        """
+        gaps = [second - first for first, second in zip(self.frames, self.frames[1:])]
+        return min(gaps) if gaps else 1
+
+    @property
+    def ranges(self):
+        """
+        The frames as ``(first, last, step)`` ranges.
+
+        :rtype: list[tuple[int, int, int]]
+        """
+        return compact_frame_ranges(self.frames)
+
+    @property
+    def missing_frames(self):
+        """
+        The frames missing between the first and last frames, assuming every
+        :attr:`step` frames were rendered.
+
+        :rtype: list[int]
+        """
+        if not self.frames:
+            return []
+        present = set(self.frames)
+        return [
+            frame for frame in range(self.frames[0], self.frames[-1] + 1, self.step)
+            if frame not in present
+        ]
+
+    def __str__(self):
+        return "%s %s" % (self.path, format_frame_ranges(self.ranges))
+
+
+class SequenceScanner(object):
+    """
+    Finds the frame sequences of folders, listing each folder only once for
+    as long as its modification time doesn't change.
+    """
+    def __init__(self):
+        self._folders = {}
+
+    def scan(self, folder):
+        """
+        Get all the frame sequences of a folder.
+
+        :param folder: Folder to scan.
+        :type folder: str
+        :returns: Sequences keyed by ``(prefix, suffix)``.
+        :rtype: dict[tuple[str, str], FrameSequence]
+        """
+        try:
+            mtime = os.stat(folder).st_mtime
+        except OSError:
+            return {}
+        cached = self._folders.get(folder)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        sequences = {}
+        for name in self._list(folder):
+            match = FRAME_FILE_REGEX.match(name)
+            if not match:
+                continue
+            prefix, frame, suffix = match.group("prefix", "frame", "suffix")
+            sequence = sequences.get((prefix, suffix))
+            if sequence is None:
+                sequence = sequences[(prefix, suffix)] = FrameSequence(
+                    folder, prefix, suffix, len(frame.lstrip("-")))
+            sequence.add(int(frame), name)
+        for sequence in sequences.values():
+            sequence.finalize()
+
+        if time.time() - mtime > SETTLE_SECONDS:
+            self._folders[folder] = (mtime, sequences)
+        return sequences
+
+    @staticmethod
+    def _list(folder):
+        if scandir is not None:
+            return [entry.name for entry in scandir(folder) if entry.is_file()]
+        return os.listdir(folder)
+
+    def find(self, path):
+        """
+        Get the frame sequence of a path.
+
+        :param path: A sequence path, its frame number given as a number or
+            as ``####``, ``%04d`` or ``@@@@``.
+        :type path: str
+        :returns: The sequence, or None if no frame exists on disk.
+        :rtype: FrameSequence
+        """
+        folder, name = os.path.split(path)
+        match = SEQUENCE_PATH_REGEX.match(name)
+        if not match:
+            return None
+        return self.scan(folder).get(match.group("prefix", "suffix"))
+
+    def clear(self):
+        """
+        Forget all the folders scanned.
+        """
+        self._folders.clear()
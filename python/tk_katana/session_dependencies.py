@@ -0,0 +1,94 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Find the files the current scene depends on, in a single walk of the nodes
+that can reference files.
+"""
+import os
+import re
+
+from .asset_prefetch import iter_string_values
+
+
+# Node types whose parameters can reference files
+DEPENDENCY_NODE_TYPES = (
+    "Alembic_In",
+    "AttributeFile_In",
+    "ImageRead",
+    "LiveGroup",
+    "LookFileAssign",
+    "LookFileGlobalsAssign",
+    "LookFileMaterialsIn",
+    "Material",
+    "PrimitiveCreate",
+    "ScenegraphXml_In",
+    "UsdIn",
+    "ArnoldShadingNode",
+    "DlShadingNode",
+    "PrmanShadingNode",
+    "RenderOutputDefine",
+)
+
+# Absolute file paths with an extension
+PATH_REGEX = re.compile(r"^(?:[A-Za-z]:)?[/\\].*\.[A-Za-z0-9]{1,8}$")
+
+
+def _get_asset_plugin():
+    """
+    Get the Shotgun asset plug-in, or None if Katana hasn't loaded it.
+    """
+    try:
+        # Made importable by the plug-in once Katana has loaded it
+        import ShotgunAssetPlugin
+    except ImportError:
+        return None
+    return ShotgunAssetPlugin.getPlugin()
+
+
+def iter_referenced_paths(nodes, asset_plugin=None):
+    """
+    Yield the file paths referenced by the string parameters of nodes.
+
+    Values are read evaluated, so parameters driven by expressions give
+    their result. Environment variables are expanded and asset IDs resolved.
+
+    :param nodes: Katana nodes to inspect.
+    :type nodes: list
+    :param asset_plugin: The Shotgun asset plug-in, to resolve asset IDs.
+    :rtype: generator[str]
+    """
+    for value in iter_string_values(nodes):
+        if asset_plugin is not None and asset_plugin.isAssetId(value):
+            value = asset_plugin.resolveAsset(value)
+            if not value:
+                continue
+        if "$" in value:
+            value = os.path.expandvars(value)
+        if value.startswith("~"):
+            value = os.path.expanduser(value)
+        if PATH_REGEX.match(value):
+            yield os.path.normpath(value)
+
+
+def find_session_dependencies(scene_index, node_types=DEPENDENCY_NODE_TYPES):
+    """
+    Find the files referenced by the scene.
+
+    Only the nodes of the given types are walked, found through the scene
+    index without walking the whole scene, so the walk is linear in the
+    number of those nodes.
+
+    :param scene_index: The scene index.
+    :type scene_index: SceneIndex
+    :param node_types: Types of the nodes to inspect.
+    :type node_types: tuple[str]
+    :returns: The unique paths referenced, sorted.
+    :rtype: list[str]
+    """
+    nodes = [
+        node for node_type in node_types
+        for node in scene_index.get_nodes_by_type(node_type)
+    ]
+    return sorted(set(iter_referenced_paths(nodes, _get_asset_plugin())))
@@ -0,0 +1,563 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Transfer many files, such as the frames of a render, in parallel.
+"""
+import errno
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Linux ioctl cloning a whole file, sharing its blocks copy-on-write
+FICLONE = 0x40049409
+
+# Errors meaning a link or clone isn't possible, rather than a real failure
+LINK_UNSUPPORTED_ERRNOS = set(
+    getattr(errno, name) for name in (
+        "EXDEV", "EPERM", "EOPNOTSUPP", "ENOTSUP", "ENOTTY", "EINVAL",
+        "EMLINK", "ENOSYS", "EACCES",
+    ) if hasattr(errno, name)
+)
+
+# Transfer methods, as reported by transfer_file, and for up to date files
+COPY, HARDLINK, REFLINK, SKIPPED = "copy", "hardlink", "reflink", "skipped"
+
+# Name of the manifest recording the files transferred to a folder
+MANIFEST_NAME = ".publish_manifest.json"
+
+# Name of the index of the contents published to an area
+CONTENT_INDEX_NAME = ".content_index.json"
+
+# Size of the blocks read when checksumming files
+CHECKSUM_BLOCK_SIZE = 8 * 1024 * 1024
+
+# Seconds within which modification times are the same, as copies made by
+# Python 2 don't keep them exactly
+MTIME_TOLERANCE = 1e-3
+
+
+class TransferError(Exception):
+    """
+    Raised when some of the files couldn't be transferred.
+    """
+    def __init__(self, failures):
+        """
+        :param failures: ``(source, destination, error)`` of the files which
+            failed.
+        """
+        self.failures = failures
+        source, destination, error = failures[0]
+        super(TransferError, self).__init__(
+            "Failed to transfer %d file(s), '%s' to '%s': %s" % (
+                len(failures), source, destination, error)
+        )
+
+
+def _temp_path(destination):
+    """
+    Temporary path next to the destination, so renaming it is atomic.
+    """
+    folder, name = os.path.split(destination)
+    return os.path.join(
+        folder, ".%s.%d-%d.part" % (name, os.getpid(), threading.current_thread().ident))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _replace(source, destination):
+    """
+    Rename ``source`` to ``destination``, overwriting it on all platforms.
+    """
+    try:
+        os.rename(source, destination)
+    except OSError:
+        if not sys.platform.startswith("win") or not os.path.exists(destination):
+            raise
+        os.remove(destination)
+        os.rename(source, destination)
+
+
+def _reflink(source, destination):
+    """
+    Clone the source's blocks into the destination, copy-on-write.
+    """
+    with open(source, "rb") as source_file:
+        with open(destination, "wb") as destination_file:
+            fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+    shutil.copystat(source, destination)
+
+
+def _copy_with_checksum(source, destination):
+    """
+    Copy a file in large blocks, checksumming them on the way.
+
+    :returns: SHA-1 of the file's contents.
+    :rtype: str
+    """
+    sha1 = hashlib.sha1()
+    with open(source, "rb") as source_file:
+        with open(destination, "wb") as destination_file:
+            for block in iter(lambda: source_file.read(CHECKSUM_BLOCK_SIZE), b""):
+                sha1.update(block)
+                destination_file.write(block)
+    shutil.copystat(source, destination)
+    return sha1.hexdigest()
+
+
+def file_checksum(path):
+    """
+    SHA-1 of a file's contents, read in blocks.
+
+    :rtype: str
+    """
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(CHECKSUM_BLOCK_SIZE), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+class PublishManifest(object):
+    """
+    Record of the files transferred to a folder and whether the last
+    transfer to it completed, stored in the folder itself.
+    """
+    def __init__(self, folder):
+        """
+        Load the manifest of a folder, empty if it has none.
+
+        :param folder: The destination folder.
+        """
+        self.folder = folder
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        self.complete = True
+        self.files = {}
+        try:
+            with open(self.path) as handle:
+                data = json.load(handle)
+        except (IOError, OSError, ValueError):
+            return
+        self.complete = data.get("complete", False)
+        self.files = data.get("files", {})
+
+    @classmethod
+    def is_incomplete(cls, folder):
+        """
+        Whether the last transfer to a folder failed or was interrupted.
+
+        :param folder: The destination folder.
+        :rtype: bool
+        """
+        return os.path.exists(os.path.join(folder, MANIFEST_NAME)) and not cls(folder).complete
+
+    def record(self, name, stat, checksum=None):
+        """
+        Record a file transferred, as the stat of its source.
+
+        :param name: File name in the folder.
+        :param stat: ``os.stat`` result of the source.
+        :param checksum: Optional checksum of the file.
+        """
+        self.files[name] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "checksum": checksum,
+        }
+
+    def verify(self, checksum=False):
+        """
+        Check the files recorded are still there, unchanged.
+
+        Only sizes are compared by default, so published files can be
+        checked without reading them.
+
+        :param checksum: Whether to also compare the files' checksums, where
+            recorded.
+        :returns: Names of the files missing or changed.
+        :rtype: list[str]
+        """
+        invalid = []
+        for name, entry in sorted(self.files.items()):
+            path = os.path.join(self.folder, name)
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                invalid.append(name)
+                continue
+            if size != entry["size"] or (
+                    checksum and entry.get("checksum")
+                    and file_checksum(path) != entry["checksum"]):
+                invalid.append(name)
+        return invalid
+
+    def save(self):
+        """
+        Write the manifest, atomically.
+        """
+        temp_path = _temp_path(self.path)
+        with open(temp_path, "w") as handle:
+            json.dump({"complete": self.complete, "files": self.files}, handle)
+        _replace(temp_path, self.path)
+
+
+class ContentIndex(object):
+    """
+    Index of the contents published to an area, by checksum, so a file
+    identical to one already published can be linked to it rather than
+    copied again.
+
+    Paths are stored relative to the area, so it can be mounted anywhere.
+    """
+    def __init__(self, folder):
+        """
+        Load the index of an area, empty if it has none.
+
+        :param folder: The publish area, the folder holding all the versions.
+        """
+        self.folder = folder
+        self.path = os.path.join(folder, CONTENT_INDEX_NAME)
+        self.contents = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as handle:
+                return json.load(handle).get("contents", {})
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def find(self, checksum, size):
+        """
+        Get the published file with the given content.
+
+        :param str checksum: SHA-1 of the content.
+        :param int size: Size of the content, checked against the file's.
+        :returns: The path of the file, or None.
+        :rtype: str
+        """
+        relative_path = self.contents.get(checksum)
+        if relative_path is None:
+            return None
+        path = os.path.join(self.folder, relative_path)
+        try:
+            if os.stat(path).st_size == size:
+                return path
+        except OSError:
+            pass
+        return None
+
+    def add(self, checksum, path):
+        """
+        Record a published file and save the index, merged with the entries
+        other sessions may have saved meanwhile.
+
+        :param str checksum: SHA-1 of the file's content.
+        :param str path: The published file, in the area.
+        """
+        self.contents = self._load()
+        self.contents[checksum] = os.path.relpath(path, self.folder)
+        temp_path = _temp_path(self.path)
+        with open(temp_path, "w") as handle:
+            json.dump({"contents": self.contents}, handle)
+        _replace(temp_path, self.path)
+
+
+def _same_mtime(first, second):
+    """
+    Whether two modification times are the same. Python 2's ``copystat``
+    doesn't keep them exactly, so they are compared to the millisecond.
+    """
+    return abs(first - second) < MTIME_TOLERANCE
+
+
+def _entry_matches(entry, source_stat):
+    """
+    Whether a manifest entry was recorded from a source with this stat.
+    """
+    return (
+        entry is not None
+        and entry["size"] == source_stat.st_size
+        and _same_mtime(entry["mtime"], source_stat.st_mtime)
+    )
+
+
+def is_up_to_date(source_stat, destination, entry=None, checksum=None):
+    """
+    Whether a destination file matches its source.
+
+    :param source_stat: ``os.stat`` result of the source.
+    :param destination: The destination file.
+    :param entry: The destination's manifest entry, if any.
+    :param checksum: Checksum of the source to compare the destination's to,
+        None to only compare sizes and modification times.
+    :rtype: bool
+    """
+    try:
+        destination_stat = os.stat(destination)
+    except OSError:
+        return False
+    if destination_stat.st_size != source_stat.st_size:
+        return False
+    if _entry_matches(entry, source_stat):
+        if checksum is None or entry.get("checksum") == checksum:
+            return True
+    if checksum is not None:
+        return file_checksum(destination) == checksum
+    return _same_mtime(destination_stat.st_mtime, source_stat.st_mtime)
+
+
+def _may_be_up_to_date(source_stat, destination, entry=None):
+    """
+    Whether a destination may still match its source: it has the source's
+    size and modification time, or the source didn't change since it was
+    recorded in the manifest.
+    """
+    if _entry_matches(entry, source_stat):
+        return True
+    try:
+        destination_stat = os.stat(destination)
+    except OSError:
+        return False
+    return destination_stat.st_size == source_stat.st_size and _same_mtime(
+        destination_stat.st_mtime, source_stat.st_mtime)
+
+
+def same_filesystem(source, destination_folder):
+    """
+    Whether a file and a folder are on the same device, so they can be
+    linked.
+
+    :rtype: bool
+    """
+    try:
+        return os.stat(source).st_dev == os.stat(destination_folder).st_dev
+    except OSError:
+        return False
+
+
+def transfer_file(source, destination, hardlink=False, reflink=True, checksum=False):
+    """
+    Transfer a file, trying the fast paths first.
+
+    The file is written next to the destination then renamed, so the
+    destination is never left partially written. Copied files are
+    checksummed while being copied, linked ones are read once.
+
+    :param source: File to transfer.
+    :param destination: Path to transfer it to, its folder must exist.
+    :param hardlink: Whether the destination may be a hard link to the
+        source. Only safe if the source is never rewritten in place.
+    :param reflink: Whether to try a copy-on-write clone of the source.
+    :param checksum: Whether to checksum the file.
+    :returns: The method used, one of :data:`REFLINK`, :data:`HARDLINK` or
+        :data:`COPY`, and the file's SHA-1 or None.
+    :rtype: tuple[str, str]
+    """
+    temp_path = _temp_path(destination)
+    can_link = (hardlink or reflink) and same_filesystem(
+        source, os.path.dirname(destination))
+    try:
+        method = digest = None
+        if can_link and reflink and fcntl is not None and sys.platform.startswith("linux"):
+            try:
+                _reflink(source, temp_path)
+                method = REFLINK
+            except (IOError, OSError) as e:
+                if e.errno not in LINK_UNSUPPORTED_ERRNOS:
+                    raise
+                _remove(temp_path)
+        if method is None and can_link and hardlink and hasattr(os, "link"):
+            try:
+                os.link(source, temp_path)
+                method = HARDLINK
+            except OSError as e:
+                if e.errno not in LINK_UNSUPPORTED_ERRNOS:
+                    raise
+        if method is None:
+            if checksum:
+                digest = _copy_with_checksum(source, temp_path)
+            else:
+                shutil.copy2(source, temp_path)
+            method = COPY
+        elif checksum:
+            digest = file_checksum(source)
+        _replace(temp_path, destination)
+    except BaseException:
+        _remove(temp_path)
+        raise
+    return method, digest
+
+
+def transfer_files(pairs, workers=8, hardlink=False, reflink=True, progress=None,
+                   resume=False, compare_checksums=False, checksums=None):
+    """
+    Transfer files with a bounded number of concurrent streams.
+
+    The first failure cancels the transfers not started yet and a
+    :class:`TransferError` is raised. Unless resuming, all the destinations
+    written by this call are removed first, so a failed transfer never leaves
+    a partial sequence behind.
+
+    When resuming, a :class:`PublishManifest` is kept in each destination
+    folder, recording the files transferred as they complete. Destinations
+    matching their source are skipped, so running a failed transfer again
+    only transfers the missing or changed files.
+
+    When checksums are requested, every file is checksummed by the thread
+    transferring it, while it is copied, and the checksums are recorded in
+    the manifests too. When comparing checksums, sources are only hashed
+    ahead of the transfer if their destination has the same size and
+    modification time, changed sources are hashed while they are copied.
+
+    :param pairs: ``(source, destination)`` of the files to transfer, the
+        destination folders must exist.
+    :type pairs: list[tuple[str, str]]
+    :param workers: Maximum number of files transferred at once.
+    :type workers: int
+    :param hardlink: Whether destinations may be hard links to their sources.
+    :param reflink: Whether to try copy-on-write clones.
+    :param progress: Optional callable, called from the calling thread with
+        the number of files done and the total after each file.
+    :param resume: Whether to skip the files already transferred and keep the
+        files transferred on failure.
+    :param compare_checksums: Whether to compare the files' checksums rather
+        than their sizes and modification times when resuming.
+    :param checksums: Optional dictionary, filled with the SHA-1 of every
+        destination.
+    :type checksums: dict[str, str]
+    :returns: Number of files transferred by each method, and skipped.
+    :rtype: dict[str, int]
+    """
+    pairs = list(pairs)
+    counts = {COPY: 0, HARDLINK: 0, REFLINK: 0, SKIPPED: 0}
+    if not pairs:
+        return counts
+
+    manifests = {}
+    if resume:
+        for _, destination in pairs:
+            folder = os.path.dirname(destination)
+            if folder not in manifests:
+                manifests[folder] = PublishManifest(folder)
+        # Saved right away so an interrupted transfer is known to be one
+        for manifest in manifests.values():
+            manifest.complete = False
+            manifest.save()
+
+    cancelled = threading.Event()
+
+    compute_checksums = checksums is not None or compare_checksums
+
+    def transfer(pair):
+        source, destination = pair
+        if cancelled.is_set():
+            return pair, None, None, None, None
+        # Destinations which already exist are left alone by the cleanup
+        existed = os.path.lexists(destination)
+        try:
+            source_stat = digest = None
+            if resume:
+                source_stat = os.stat(source)
+                folder, name = os.path.split(destination)
+                entry = manifests[folder].files.get(name)
+                if not compare_checksums:
+                    up_to_date = is_up_to_date(source_stat, destination, entry)
+                elif _may_be_up_to_date(source_stat, destination, entry):
+                    digest = file_checksum(source)
+                    up_to_date = is_up_to_date(source_stat, destination, entry, digest)
+                else:
+                    up_to_date = False
+                if up_to_date:
+                    # Keep the checksum recorded, the file didn't change
+                    digest = digest or (entry or {}).get("checksum")
+                    if compute_checksums and digest is None:
+                        digest = file_checksum(destination)
+                    return pair, SKIPPED, existed, source_stat, digest
+            if digest is None:
+                method, digest = transfer_file(
+                    source, destination, hardlink, reflink, compute_checksums)
+            else:
+                method, _ = transfer_file(source, destination, hardlink, reflink)
+            return pair, method, existed, source_stat, digest
+        except Exception as e:
+            cancelled.set()
+            return pair, e, existed, None, None
+
+    written = []
+    failures = []
+    # Manifests are saved every so often, for transfers killed outright
+    save_every = max(50, len(pairs) // 10)
+    pool = ThreadPool(max(1, min(workers, len(pairs))))
+    finished = False
+    try:
+        for done, (pair, result, existed, source_stat, digest) in enumerate(
+                pool.imap_unordered(transfer, pairs), 1):
+            if isinstance(result, Exception):
+                failures.append((pair[0], pair[1], result))
+            elif result is not None:
+                counts[result] += 1
+                if not existed:
+                    written.append(pair[1])
+                if checksums is not None:
+                    checksums[pair[1]] = digest
+                if resume:
+                    folder, name = os.path.split(pair[1])
+                    manifests[folder].record(name, source_stat, digest)
+            if resume and not done % save_every:
+                for manifest in manifests.values():
+                    manifest.save()
+            if progress is not None:
+                progress(done, len(pairs))
+        finished = True
+    finally:
+        pool.close()
+        pool.join()
+        # Left incomplete if interrupted, e.g. by a failed progress callback
+        for manifest in manifests.values():
+            manifest.complete = finished and not failures and not cancelled.is_set()
+            manifest.save()
+
+    if failures:
+        if not resume:
+            for destination in written:
+                _remove(destination)
+        raise TransferError(failures)
+    return counts
+
+
+def transfer_deduplicated(source, destination, content_index):
+    """
+    Transfer a file, linking it to an identical file already published to
+    the same area if there is one.
+
+    :param source: File to transfer.
+    :param destination: Path to transfer it to, its folder must exist.
+    :param content_index: Index of the area the destination is in.
+    :type content_index: ContentIndex
+    :returns: The method used and the file's SHA-1.
+    :rtype: tuple[str, str]
+    """
+    checksum = file_checksum(source)
+    existing = content_index.find(checksum, os.path.getsize(source))
+    if existing is not None and existing != destination:
+        method, _ = transfer_file(existing, destination, hardlink=True)
+        return method, checksum
+    method, _ = transfer_file(source, destination)
+    content_index.add(checksum, destination)
+    return method, checksum
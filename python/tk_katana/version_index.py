@@ -0,0 +1,194 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Find which versions of a template exist on disk with as few directory
+listings as possible.
+"""
+import os
+import re
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+# Stands in for the version when applying fields, then replaced by a regex
+VERSION_SENTINEL = 987654321
+
+# Value given to frame sequence keys, as used by the publish hooks
+SEQUENCE_SENTINEL = "####"
+
+
+def iter_names(folder):
+    """
+    Lazily yield the entry names of a folder, nothing if it doesn't exist.
+
+    Uses ``scandir`` when available, so callers stopping at the first match
+    don't pay for listing the whole folder.
+
+    :param folder: Folder to list.
+    :type folder: str
+    :rtype: generator[str]
+    """
+    try:
+        if scandir is not None:
+            for entry in scandir(folder):
+                yield entry.name
+        else:
+            for name in os.listdir(folder):
+                yield name
+    except OSError:
+        return
+
+
+def _split_path(path):
+    """
+    Split a path into its root (e.g. "/" or "C:\\") and its components.
+    """
+    drive, path = os.path.splitdrive(os.path.normpath(path))
+    components = [part for part in re.split(r"[\\/]", path) if part]
+    root = drive + (os.sep if path[:1] in ("/", "\\") else "")
+    return root, components
+
+
+def _compile_component(component):
+    """
+    Compile a path component holding sentinels into a regex.
+
+    The first version of the component is captured in a ``version`` group,
+    later ones in the same component must match it.
+
+    :returns: The regex, or None if the component is a literal.
+    """
+    version_text = str(VERSION_SENTINEL)
+    if version_text not in component and SEQUENCE_SENTINEL not in component:
+        return None
+
+    pattern = []
+    for index, part in enumerate(component.split(version_text)):
+        if index == 1:
+            pattern.append(r"(?P<version>\d+)")
+        elif index:
+            pattern.append(r"(?P=version)")
+        pattern.append(
+            re.escape(part).replace(
+                re.escape(SEQUENCE_SENTINEL), r"(?:\d+|#+|%0?\d*d|@+)")
+        )
+    return re.compile("^%s$" % "".join(pattern))
+
+
+class VersionIndex(object):
+    """
+    The versions of a template found on disk for a set of fields.
+
+    Rather than globbing every version, the folders leading to the files are
+    walked once: literal path components are joined without listing
+    anything, and only the folders whose name depends on the version (or on
+    the frame number) are listed, each a single time. Once a version is
+    known to exist, listing its folder stops at the first match.
+    """
+    def __init__(self, template, fields, version_key="version"):
+        """
+        Build the index.
+
+        :param template: Template of the files.
+        :param fields: Template fields, the version and frame sequence keys
+            may be missing.
+        :type fields: dict
+        :param version_key: Name of the version key.
+        :type version_key: str
+        """
+        self.template = template
+        self.fields = dict(fields)
+        self.version_key = version_key
+        self.paths = {}
+        self._build(fields)
+
+    def _build(self, fields):
+        probe = dict(fields)
+        probe[self.version_key] = VERSION_SENTINEL
+        for name, key in self.template.keys.items():
+            if name not in probe and getattr(key, "is_abstract", False):
+                probe[name] = SEQUENCE_SENTINEL
+
+        root, components = _split_path(self.template.apply_fields(probe))
+        # The version is checked across components while walking
+        compiled = [
+            (component, _compile_component(component)) for component in components
+        ]
+        self._walk(root, compiled, 0, None)
+
+    def _walk(self, folder, compiled, index, version):
+        """
+        Match the folder's entries against the component at ``index``.
+        """
+        # Join all the literal components at once, without listing them
+        while index < len(compiled) and compiled[index][1] is None:
+            folder = os.path.join(folder, compiled[index][0])
+            index += 1
+        if index == len(compiled):
+            if version is not None and os.path.exists(folder):
+                self.paths.setdefault(version, folder)
+            return
+
+        regex = compiled[index][1]
+        is_last = index == len(compiled) - 1
+        for name in iter_names(folder):
+            match = regex.match(name)
+            if not match:
+                continue
+            found = match.groupdict().get("version")
+            found = int(found) if found is not None else version
+            if version is not None and found != version:
+                continue
+            if is_last:
+                if found is not None:
+                    self.paths.setdefault(found, os.path.join(folder, name))
+                if version is not None:
+                    # The version was in a parent folder and now exists
+                    return
+            else:
+                self._walk(os.path.join(folder, name), compiled, index + 1, found)
+
+    @property
+    def versions(self):
+        """
+        The versions found, sorted.
+
+        :rtype: list[int]
+        """
+        return sorted(self.paths)
+
+    def next_version(self, version=0):
+        """
+        Get the first version after the given one which isn't on disk.
+
+        :param version: The version to start from, e.g. the current one.
+        :type version: int
+        :rtype: int
+        """
+        version += 1
+        while version in self.paths:
+            version += 1
+        return version
+
+    def get_path(self, version):
+        """
+        Get the path of a version, whether it exists or not.
+
+        :param version: The version.
+        :type version: int
+        :rtype: str
+        """
+        fields = dict(self.fields)
+        fields[self.version_key] = version
+        return self.template.apply_fields(fields)
+
+    def __contains__(self, version):
+        return version in self.paths
@@ -1,11 +1,691 @@
 # Copyright (c) 2015 The Foundry Visionmongers Ltd. All Rights Reserved.
+import ast
+import atexit
+import contextlib
+import errno
+import functools
+import hashlib
+import json
 import os
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+try:
+    from urllib import quote, unquote
+except ImportError:
+    from urllib.parse import quote, unquote
+
 import AssetAPI
 
 # Shotgun - This should already be in the PYTHONPATH due to the init script.
 import sgtk
 
 
+# Publish types of the assets Katana creates, keyed by AssetAPI asset type
+PUBLISH_TYPES = {
+    "image": "Rendered Image",
+    "look file": "Katana Look File",
+    "katana scene": "Katana Scene",
+    "alembic": "Alembic Cache",
+}
+
+# Reserved field holding the template name in the fields returned by
+# ShotgunAssetPlugin.getAssetFields(includeDefaults=True), so the fields
+# Katana passes back when creating an asset are enough to build its ID
+TEMPLATE_FIELD = "template"
+
+# Highest resolution clock available (Python 2 has no perf_counter)
+_clock = getattr(time, "perf_counter", time.time)
+
+# Version tags understood by ShotgunAssetPlugin.resolveAssetVersion()
+LATEST_VERSION_TAG = "latest"
+LATEST_APPROVED_VERSION_TAG = "latest approved"
+
+
+# Prefix of the compact asset IDs: sg://<template>?<key>=<value>&...
+ASSET_URI_SCHEME = "sg://"
+
+try:
+    _intern = sys.intern
+except AttributeError:
+    _intern = intern  # Python 2
+
+
+def _looksLikeAssetId(string):
+    """
+    Cheap syntactic test telling if a string could be an asset ID at all.
+
+    Asset IDs are either ``sg://`` URIs or legacy ``repr``'d dicts holding
+    "template" and "fields" keys, so anything else (file paths, numbers,
+    expressions...) is rejected without any parsing.
+    """
+    text = string if hasattr(string, "strip") else str(string)
+    text = text.strip()
+    if text.startswith(ASSET_URI_SCHEME):
+        return len(text) > len(ASSET_URI_SCHEME)
+    return (
+        text[:1] == "{"
+        and text[-1:] == "}"
+        and "template" in text
+        and "fields" in text
+    )
+
+
+def parseAssetUri(uri):
+    """
+    Parses a compact ``sg://<template>?<key>=<value>&...`` asset ID.
+
+    This is a single left to right pass over the string, with no ``eval``.
+    Template names are interned as the same few are repeated in every ID.
+    Values are returned as strings, percent-decoded.
+
+    :returns: ``(template, fields)``, or None if it is not an asset URI.
+    :rtype: tuple
+    """
+    uri = uri.strip()
+    if not uri.startswith(ASSET_URI_SCHEME):
+        return None
+
+    start = len(ASSET_URI_SCHEME)
+    query = uri.find("?", start)
+    if query == -1:
+        query = len(uri)
+    template = uri[start:query]
+    if not template:
+        return None
+
+    fields = {}
+    for pair in uri[query + 1:].split("&"):
+        if not pair:
+            continue
+        key, _, value = pair.partition("=")
+        if "%" in value:
+            value = unquote(value)
+        fields[key] = value
+    return _intern(str(template)), fields
+
+
+def formatAssetUri(template, fields):
+    """
+    Builds the compact ``sg://`` asset ID of a template name and fields.
+
+    Keys are sorted so the same asset always gets the same ID.
+
+    :rtype: str
+    """
+    query = "&".join(
+        "%s=%s" % (key, quote(str(fields[key]), safe=""))
+        for key in sorted(fields)
+    )
+    return "%s%s?%s" % (ASSET_URI_SCHEME, template, query)
+
+
+def parseLegacyAssetId(assetId):
+    """
+    Parses a legacy ``repr``'d dict asset ID.
+
+    :returns: ``(template, fields)``, or None if it is not a legacy ID.
+    :rtype: tuple
+    """
+    try:
+        fullDict = ast.literal_eval(str(assetId).strip())
+    except (ValueError, SyntaxError):
+        return None
+    if not isinstance(fullDict, dict):
+        return None
+    if "template" not in fullDict or "fields" not in fullDict:
+        return None
+    return fullDict["template"], fullDict["fields"]
+
+
+def parseAssetId(assetId):
+    """
+    Parses an asset ID of either form.
+
+    :returns: ``(template, fields)``, or None if it is not an asset ID.
+    :rtype: tuple
+    """
+    if not _looksLikeAssetId(assetId):
+        return None
+    text = assetId if hasattr(assetId, "strip") else str(assetId)
+    if text.strip().startswith(ASSET_URI_SCHEME):
+        return parseAssetUri(text)
+    return parseLegacyAssetId(text)
+
+
+def legacyToAssetUri(assetId):
+    """
+    Converts a legacy ``repr``'d dict asset ID to the compact form.
+
+    Asset IDs already in the compact form are returned as they are.
+
+    :rtype: str
+    """
+    parsed = parseAssetId(assetId)
+    if parsed is None:
+        raise ValueError("Not an asset ID: %r" % (assetId,))
+    return formatAssetUri(parsed[0], parsed[1] or {})
+
+
+def assetUriToLegacy(uri):
+    """
+    Converts a compact asset ID to the legacy ``repr``'d dict form.
+
+    Field values stay strings, as their types are only known from the
+    template.
+
+    :rtype: str
+    """
+    parsed = parseAssetUri(uri)
+    if parsed is None:
+        raise ValueError("Not an asset URI: %r" % (uri,))
+    return repr({"template": parsed[0], "fields": parsed[1]})
+
+
+class ResolutionMetrics(object):
+    """
+    Call counts, latency histograms and cache hit rates of the plug-in.
+
+    Set ``SGTK_KATANA_ASSET_METRICS_FILE`` to have them written as JSON when
+    the process exits, ``{pid}`` in the path is replaced by the process ID.
+    They can also be dumped at any time with :func:`dumpMetrics`.
+    """
+    # Upper bounds, in seconds, of the latency histogram buckets
+    BUCKET_BOUNDS = (0.0001, 0.001, 0.01, 0.1, 1.0)
+    BUCKET_LABELS = ("<0.1ms", "<1ms", "<10ms", "<100ms", "<1s", ">=1s")
+
+    def __init__(self):
+        self._timings = {}
+        self._counters = {}
+        # Resolution may happen from a prefetch thread pool
+        self._lock = threading.Lock()
+
+    def addTiming(self, name, seconds):
+        """
+        Records one call of ``name`` which lasted the given duration.
+        """
+        for index, bound in enumerate(self.BUCKET_BOUNDS):
+            if seconds < bound:
+                break
+        else:
+            index = len(self.BUCKET_BOUNDS)
+
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                    "buckets": [0] * len(self.BUCKET_LABELS),
+                }
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+            timing["buckets"][index] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """
+        Context manager recording the duration of its block as ``name``.
+        """
+        start = _clock()
+        try:
+            yield
+        finally:
+            self.addTiming(name, _clock() - start)
+
+    def increment(self, name, amount=1):
+        """
+        Increments the counter ``name``.
+
+        Counters named ``cache.<name>.hit`` and ``cache.<name>.miss`` are
+        reported together as the hit rate of ``<name>``.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def asDict(self):
+        """
+        Returns all the metrics as a JSON serialisable dict.
+
+        :rtype: dict
+        """
+        # Snapshot, prefetch threads may be recording meanwhile
+        with self._lock:
+            snapshot = [
+                (name, dict(timing, buckets=list(timing["buckets"])))
+                for name, timing in self._timings.items()
+            ]
+            counters = dict(self._counters)
+
+        timings = {}
+        for name, timing in snapshot:
+            timings[name] = {
+                "count": timing["count"],
+                "total_seconds": timing["total"],
+                "mean_seconds": timing["total"] / timing["count"],
+                "max_seconds": timing["max"],
+                "histogram": dict(zip(self.BUCKET_LABELS, timing["buckets"])),
+            }
+
+        hitRates = {}
+        for name, hits in counters.items():
+            if not (name.startswith("cache.") and name.endswith(".hit")):
+                continue
+            cacheName = name[len("cache."):-len(".hit")]
+            total = hits + counters.get("cache.%s.miss" % cacheName, 0)
+            hitRates[cacheName] = float(hits) / total if total else 0.0
+
+        return {
+            "pid": os.getpid(),
+            "time": time.time(),
+            "timings": timings,
+            "counters": counters,
+            "cache_hit_rates": hitRates,
+        }
+
+    def dump(self, path):
+        """
+        Writes the metrics as JSON to the given path.
+        """
+        with open(path.replace("{pid}", str(os.getpid())), "w") as handle:
+            json.dump(self.asDict(), handle, indent=2, sort_keys=True)
+
+    def reset(self):
+        """
+        Forgets everything recorded so far.
+        """
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+
+def _timed(method):
+    """
+    Decorator recording the calls of a plug-in method in its metrics.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = _clock()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.metrics.addTiming(name, _clock() - start)
+    return wrapper
+
+
+class SharedResolutionCache(object):
+    """
+    On-disk cache of resolved asset paths, shared by every process on a host.
+
+    Set ``SGTK_KATANA_ASSET_CACHE_DIR`` to a local folder to enable it.
+    Each entry lives in its own small file named after the hash of its key.
+    Entries are written to a temporary file and renamed into place, so
+    concurrent readers never see a partially written entry and concurrent
+    writers simply replace each other's (identical) results without locking.
+
+    Entries are readable by everyone (mode 0644), so render processes running
+    as other users on the host can share them. For them to add entries too,
+    the cache folder must be writable by all of them, e.g. mode 1777, and
+    their umask must keep the subfolders they create writable (000, or 002
+    for users sharing a group).
+
+    Optional environment variables:
+
+    - ``SGTK_KATANA_ASSET_CACHE_TTL``: seconds before an entry is stale and
+      resolved again (default: 600, 0 never expires).
+    - ``SGTK_KATANA_ASSET_CACHE_MAX_ENTRIES``: number of entries kept before
+      the oldest ones are evicted (default: 100000, 0 is unlimited).
+    """
+    DEFAULT_TTL = 600
+    DEFAULT_MAX_ENTRIES = 100000
+
+    # Permissions of the entries, mkstemp() creates them private to the user
+    ENTRY_MODE = 0o644
+
+    # Number of writes from this process between two eviction passes
+    PRUNE_INTERVAL = 1000
+
+    def __init__(self, root, namespace="", ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Initialize the cache.
+
+        :param root: Folder holding the cache entries.
+        :type root: str
+        :param namespace: Prefix for every key, e.g. the pipeline
+            configuration path, so projects never share entries.
+        :type namespace: str
+        :param ttl: Seconds an entry stays valid, 0 to never expire.
+        :type ttl: int
+        :param max_entries: Entries kept before evicting, 0 for no limit.
+        :type max_entries: int
+        """
+        self.root = root
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+
+    @classmethod
+    def fromEnvironment(cls, namespace=""):
+        """
+        Create a cache from the ``SGTK_KATANA_ASSET_CACHE_*`` variables.
+
+        :returns: The cache, or None if ``SGTK_KATANA_ASSET_CACHE_DIR``
+            is not set.
+        :rtype: SharedResolutionCache
+        """
+        root = os.environ.get("SGTK_KATANA_ASSET_CACHE_DIR")
+        if not root:
+            return None
+        return cls(
+            root,
+            namespace=namespace,
+            ttl=int(os.environ.get(
+                "SGTK_KATANA_ASSET_CACHE_TTL", cls.DEFAULT_TTL)),
+            max_entries=int(os.environ.get(
+                "SGTK_KATANA_ASSET_CACHE_MAX_ENTRIES", cls.DEFAULT_MAX_ENTRIES)),
+        )
+
+    def _entryPath(self, key):
+        """
+        Get the file path storing the given key.
+
+        Entries are spread across 256 sub-folders to keep listings short.
+        """
+        digest = hashlib.sha1(
+            (self.namespace + "\n" + key).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _isStale(self, mtime, now=None):
+        if not self.ttl:
+            return False
+        return (now or time.time()) - mtime > self.ttl
+
+    def get(self, key):
+        """
+        Get the cached value for the given key.
+
+        :returns: The value, or None if missing or stale.
+        :rtype: str
+        """
+        path = self._entryPath(key)
+        try:
+            if self._isStale(os.stat(path).st_mtime):
+                self._discard(path)
+                return None
+            with open(path, "rb") as handle:
+                data = handle.read().decode("utf-8")
+        except (IOError, OSError):
+            return None
+
+        # The key is stored with the value to rule out hash collisions
+        stored_key, _, value = data.partition("\n")
+        if stored_key != self.namespace + key:
+            return None
+        return value
+
+    def set(self, key, value):
+        """
+        Store the value for the given key, replacing any existing entry.
+        """
+        path = self._entryPath(key)
+        folder = os.path.dirname(path)
+        try:
+            os.makedirs(folder)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                return
+
+        data = (self.namespace + key + "\n" + value).encode("utf-8")
+        temp_path = None
+        try:
+            handle, temp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+            try:
+                os.write(handle, data)
+            finally:
+                os.close(handle)
+            os.chmod(temp_path, self.ENTRY_MODE)
+            try:
+                os.rename(temp_path, path)
+            except OSError:
+                # Windows won't rename over an existing file
+                self._discard(path)
+                os.rename(temp_path, path)
+        except (IOError, OSError):
+            if temp_path:
+                self._discard(temp_path)
+            return
+
+        self._writes += 1
+        if self.max_entries and not self._writes % self.PRUNE_INTERVAL:
+            self.prune()
+
+    @staticmethod
+    def _discard(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _iterEntries(self):
+        """
+        Yield ``(path, mtime)`` for every entry currently on disk.
+        """
+        try:
+            folders = os.listdir(self.root)
+        except OSError:
+            return
+        for folder in folders:
+            folder_path = os.path.join(self.root, folder)
+            try:
+                names = os.listdir(folder_path)
+            except OSError:
+                continue
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(folder_path, name)
+                try:
+                    yield path, os.stat(path).st_mtime
+                except OSError:
+                    # Removed by another process in the meantime
+                    continue
+
+    def prune(self):
+        """
+        Remove stale entries, then the oldest ones above ``max_entries``.
+        """
+        now = time.time()
+        entries = []
+        for path, mtime in self._iterEntries():
+            if self._isStale(mtime, now):
+                self._discard(path)
+            else:
+                entries.append((mtime, path))
+
+        excess = len(entries) - self.max_entries
+        if self.max_entries and excess > 0:
+            entries.sort()
+            for _, path in entries[:excess]:
+                self._discard(path)
+
+    def clear(self):
+        """
+        Remove every entry of the cache.
+        """
+        for path, _ in list(self._iterEntries()):
+            self._discard(path)
+
+
+class UnresolvedAssetRegistry(object):
+    """
+    Negative cache of the asset IDs that failed to resolve.
+
+    A failed asset ID is not looked up again for ``ttl`` seconds
+    (``SGTK_KATANA_ASSET_NEGATIVE_TTL``, default: 30) and its warning is only
+    logged the first time, or when the failure reason changes. Every request
+    is counted so :meth:`logReport` can summarise the bad IDs of a render.
+    """
+    DEFAULT_TTL = 30
+
+    def __init__(self, logger, ttl=DEFAULT_TTL):
+        """
+        Initialize the registry.
+
+        :param logger: Logger used for the warnings and the report.
+        :param ttl: Seconds before a failed asset ID is looked up again.
+        :type ttl: int
+        """
+        self.logger = logger
+        self.ttl = ttl
+        self._retryAfter = {}
+        self._failures = {}
+
+    @classmethod
+    def fromEnvironment(cls, logger):
+        """
+        Create a registry using ``SGTK_KATANA_ASSET_NEGATIVE_TTL``.
+
+        :rtype: UnresolvedAssetRegistry
+        """
+        return cls(logger, ttl=int(os.environ.get(
+            "SGTK_KATANA_ASSET_NEGATIVE_TTL", cls.DEFAULT_TTL)))
+
+    def isKnownBad(self, assetId):
+        """
+        Checks if the asset ID recently failed and should not be retried yet.
+        """
+        retryAfter = self._retryAfter.get(assetId)
+        if retryAfter is None:
+            return False
+        if time.time() < retryAfter:
+            self._failures[assetId][0] += 1
+            return True
+        del self._retryAfter[assetId]
+        return False
+
+    def record(self, assetId, message, *args):
+        """
+        Records a failed lookup of the asset ID and logs its warning, unless
+        the same warning was already logged for it.
+        """
+        self._retryAfter[assetId] = time.time() + self.ttl
+        reason = message % args
+        failure = self._failures.get(assetId)
+        if failure is None:
+            self._failures[assetId] = [1, reason]
+        else:
+            failure[0] += 1
+            if failure[1] == reason:
+                return
+            failure[1] = reason
+        self.logger.warn(reason)
+
+    def forget(self):
+        """
+        Allows every failed asset ID to be looked up again. Counts are kept
+        for the report.
+        """
+        self._retryAfter.clear()
+
+    def getReport(self):
+        """
+        Returns the failed asset IDs, most requested first.
+
+        :returns: List of ``(assetId, requestCount, lastReason)``.
+        :rtype: list
+        """
+        report = [
+            (assetId, count, reason)
+            for assetId, (count, reason) in self._failures.items()
+        ]
+        report.sort(key=lambda entry: entry[1], reverse=True)
+        return report
+
+    def logReport(self):
+        """
+        Logs a summary of the asset IDs that failed to resolve, if any.
+        """
+        report = self.getReport()
+        if not report:
+            return
+        lines = ["%d asset ID(s) could not be resolved:" % len(report)]
+        for assetId, count, reason in report:
+            lines.append("  %s (requested %d time(s)): %s" % (assetId, count, reason))
+        self.logger.warn("\n".join(lines))
+
+
+class ShotgunAssetTransaction(AssetAPI.BaseAssetTransaction):
+    """
+    Buffers the PublishedFile creations made by Katana while it is open and
+    sends them to Shotgun in a single batch request when committed.
+
+    Shotgun runs a batch request as one database transaction: either every
+    entity is created or, if any fails, none of them are. A failed commit
+    therefore leaves nothing to clean up in Shotgun and keeps the buffered
+    requests so the commit can be retried or cancelled.
+    """
+    def __init__(self, shotgun, logger):
+        """
+        Initialize the transaction.
+
+        :param shotgun: Shotgun API connection.
+        :param logger: Logger of the asset plug-in.
+        """
+        AssetAPI.BaseAssetTransaction.__init__(self)
+        self.shotgun = shotgun
+        self.logger = logger
+        self._requests = []
+
+    def add(self, request):
+        """
+        Buffers a Shotgun batch request until the transaction is committed.
+
+        :param request: A request dict as expected by ``Shotgun.batch()``.
+        :type request: dict
+        """
+        self._requests.append(request)
+
+    def commit(self):
+        """
+        Sends all the buffered requests in a single batch.
+
+        :returns: The entities returned by Shotgun, in request order.
+        :rtype: list
+        """
+        if not self._requests:
+            return []
+        try:
+            results = self.shotgun.batch(self._requests)
+        except Exception:
+            self.logger.error(
+                "Publishing %d asset(s) failed, none were registered in "
+                "Shotgun.",
+                len(self._requests),
+            )
+            raise
+        self.logger.debug(
+            "Registered %d asset(s) in a single Shotgun request.",
+            len(results),
+        )
+        self._requests = []
+        return results
+
+    def cancel(self):
+        """
+        Drops all the buffered requests without sending them.
+        """
+        self._requests = []
+
+
 class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
     """
     The main class of the plug-in that will be registered as "Shotgun". It
@@ -15,9 +695,30 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
     def __init__(self):
         # Create a Tank instance
         self.tk = None
+        self.context = None
         self.logger = sgtk.platform.get_logger(__name__)
+        self.metrics = ResolutionMetrics()
+        self._resolvedPaths = {}
+        self._sharedCache = None
+        self._versionIndex = {}
+        self._approvedVersions = {}
+        self._parsedIds = {}
+        self._publishTypes = {}
+        self._unresolvedAssets = UnresolvedAssetRegistry.fromEnvironment(self.logger)
+        # Summarise the bad asset IDs once the render (or session) is over
+        atexit.register(self._unresolvedAssets.logReport)
+        atexit.register(self.__dumpMetricsAtExit)
         self.setupTank()
 
+    def __dumpMetricsAtExit(self):
+        path = os.environ.get("SGTK_KATANA_ASSET_METRICS_FILE")
+        if not path:
+            return
+        try:
+            self.metrics.dump(path)
+        except (IOError, OSError) as error:
+            self.logger.warn("Failed to write asset metrics to %s: %s", path, error)
+
     def setupTank(self):
         '''
         This function relies on the SGTK_CONTEXT environment var being previously
@@ -26,26 +727,67 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
         serialised_context = os.environ.get("SGTK_CONTEXT")
         if serialised_context:
             context = sgtk.context.deserialize(serialised_context)
+            self.context = context
             self.tk = context.tank
+            self._sharedCache = SharedResolutionCache.fromEnvironment(
+                namespace=self.tk.pipeline_configuration.get_path(),
+            )
 
     def reset(self):
         """
         Resets the state of the plug-in
         """
-        # Nothing to reset in this plug-in... If, for example, some caching was
-        # implemented then this would be the place to clear it.
-        pass
+        # Only this process' cache is cleared, the shared cache on disk
+        # expires on its own and other processes may still be using it.
+        self._resolvedPaths.clear()
+        self._versionIndex.clear()
+        self._approvedVersions.clear()
+        self._parsedIds.clear()
+        self._publishTypes.clear()
+        self._unresolvedAssets.forget()
 
-    def isAssetId(self, string): # TODO
+    def isAssetId(self, string):
         """
         Checks if the given string is a valid asset ID
         """
-        # This is a very simplistic test... but it conveys the idea of this function
-        fullDict = eval(str(string))
-        if fullDict.has_key("template") and fullDict.has_key("fields"):
-            return True
-        return None
+        # Nearly every string Katana asks about is a plain file path, reject
+        # those before paying for a full parse.
+        if not _looksLikeAssetId(string):
+            return False
+        return self.__parseAssetId(string)[0] is not None
+
+    def __parseAssetId(self, assetId):
+        """
+        Returns the template name and fields of an asset ID of either form.
 
+        Results are memoised, failed parses included. Field values of
+        compact IDs are converted to the types of the template's keys.
+
+        :returns: ``(template, fields)``, both None if it is not an asset ID.
+        :rtype: tuple
+        """
+        parsed = self._parsedIds.get(assetId)
+        if parsed is not None:
+            return parsed
+
+        parsed = parseAssetId(assetId) or (None, None)
+        templateName, fields = parsed
+        if fields and str(assetId).strip().startswith(ASSET_URI_SCHEME):
+            template = self.tk.templates.get(templateName) if self.tk else None
+            if template:
+                for key, value in fields.items():
+                    templateKey = template.keys.get(key)
+                    if templateKey is None:
+                        continue
+                    try:
+                        fields[key] = templateKey.value_from_str(value)
+                    except Exception:
+                        # Left as a string, template validation will report it
+                        pass
+        self._parsedIds[assetId] = parsed
+        return parsed
+
+    @_timed
     def resolveAsset(self, assetId, throwOnError=False):
         """
         Lookups the given asset ID in Shotgun and returns the file path that it references
@@ -62,31 +804,117 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
             )
             return assetId
 
+        assetFilePath = self._resolvedPaths.get(assetId)
+        if assetFilePath is not None:
+            self.metrics.increment("cache.memory.hit")
+            return assetFilePath
+        self.metrics.increment("cache.memory.miss")
+
+        if self._unresolvedAssets.isKnownBad(assetId):
+            self.metrics.increment("cache.negative.hit")
+            # Same as when the lookup first failed
+            return ""
+        self.metrics.increment("cache.negative.miss")
+
+        if self._sharedCache is not None:
+            assetFilePath = self._sharedCache.get(assetId)
+            if assetFilePath is not None:
+                self.metrics.increment("cache.shared.hit")
+                self._resolvedPaths[assetId] = assetFilePath
+                return assetFilePath
+            self.metrics.increment("cache.shared.miss")
+
+        assetFilePath = self.__resolveAssetFilePath(assetId)
+        if assetFilePath:
+            self._resolvedPaths[assetId] = assetFilePath
+            if self._sharedCache is not None:
+                self._sharedCache.set(assetId, assetFilePath)
+        return assetFilePath
+
+    def __resolveAssetFilePath(self, assetId):
+        """
+        Globs the asset ID's template for the file path it references,
+        bypassing any cache.
+
+        Returns an empty string whatever the failure, as resolveAsset() does
+        for the failures in the negative cache.
+        """
         # Get fields
         idFieldDict = self.getAssetFields(assetId)
         if not idFieldDict:
-            self.logger.warn(
-                "resolveAsset: Resolving asset path from asset ID failed: %s",
-                assetId,
-            )
-            return None
+            # Already recorded by getAssetFields()
+            return ""
 
         # Get template
         templateType = self.__getAssetPublishType(assetId)
-        template = self.tk.templates[templateType]
+        template = self.tk.templates.get(templateType)
         if not template:
-            self.logger.warn(
+            self._unresolvedAssets.record(
+                assetId,
                 "resolveAsset: Unable to find template: %s",
                 templateType,
             )
+            return ""
 
-        assetFilePathList = self.tk.abstract_paths_from_template( template, idFieldDict )
+        with self.metrics.timer("templateGlob"):
+            assetFilePathList = self.tk.abstract_paths_from_template( template, idFieldDict )
         assetFilePath = ""
         if len(assetFilePathList) > 0:
             # (conversion from unicode to str needed)
             assetFilePath = str(assetFilePathList[0])
+        else:
+            self._unresolvedAssets.record(
+                assetId,
+                "resolveAsset: No file found on disk for asset ID: %s",
+                assetId,
+            )
         return assetFilePath
 
+    def prefetch(self, assetIds, workers=8):
+        """
+        Resolves the given asset IDs concurrently to warm the caches, e.g.
+        right after a scene is loaded and before its first cook.
+
+        Asset IDs already resolved and duplicates are skipped.
+
+        :param assetIds: Asset IDs to resolve.
+        :param workers: Maximum number of threads resolving at once.
+        :type workers: int
+        :returns: The number of asset IDs successfully resolved.
+        :rtype: int
+        """
+        pending = [
+            assetId for assetId in set(assetIds)
+            if assetId not in self._resolvedPaths and self.isAssetId(assetId)
+        ]
+        if not pending:
+            return 0
+
+        pool = ThreadPool(max(1, min(workers, len(pending))))
+        try:
+            with self.metrics.timer("prefetch"):
+                resolved = pool.map(self.__prefetchOne, pending)
+        finally:
+            pool.close()
+            pool.join()
+        return sum(1 for path in resolved if path)
+
+    def __prefetchOne(self, assetId):
+        """
+        Resolves one asset ID from a prefetch thread, never raising.
+        """
+        try:
+            return self.resolveAsset(assetId)
+        except Exception as error:
+            self._unresolvedAssets.record(
+                assetId,
+                "prefetch: Failed to resolve asset ID %s: %s",
+                assetId,
+                error,
+            )
+            return None
+
+    @_timed
     def resolveAllAssets(self, string):
         """
         For each asset ID found in the given string (isolated by whitespaces)
@@ -97,10 +925,12 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
         for token in string.split():
             if self.isAssetId(token):
                 path = self.resolveAsset(token)
-                result = result.replace(token, path)
+                if path is not None:
+                    result = result.replace(token, path)
 
         return result
 
+    @_timed
     def resolvePath(self, assetId, frame):  # TODO -- This may need some work to work properly. How do Shotgun and Katana work with file sequences?
         """
         Resolves the given asset ID and if it comes as a file
@@ -124,41 +954,173 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
 
     def resolveAssetVersion(self, assetId, versionTag = ""):
         """
-        Returns the version for the given asset ID.
+        Returns the version for the given asset ID, as a string.
         If it is a partial asset ID (which doesn't have a version) then None is returned
+
+        ``versionTag`` can be one of:
+
+        - empty: the version embedded in the asset ID.
+        - ``"latest"``: the highest version found on disk.
+        - ``"latest approved"``: the highest version published in Shotgun
+          with the ``SGTK_KATANA_APPROVED_STATUS`` status (default: "apr").
+        - a version number, returned as it is if it exists on disk.
         """
         # Get fields
         idFieldDict = self.getAssetFields(assetId)
         if not idFieldDict:
+            # Already recorded by getAssetFields()
+            return None
+
+        embeddedVersion = idFieldDict.get(
+            "version", idFieldDict.get("Version", None))
+        if embeddedVersion is not None:
+            # An int in compact IDs, whatever was stored in legacy ones
+            embeddedVersion = str(embeddedVersion)
+        tag = str(versionTag or "").strip().lower()
+        if not tag:
+            return embeddedVersion
+
+        versionIndex = self.getAssetVersionIndex(assetId)
+        if tag == LATEST_VERSION_TAG:
+            versions = list(versionIndex)
+        elif tag == LATEST_APPROVED_VERSION_TAG:
+            versions = self.__getApprovedVersions(assetId)
+        elif tag.isdigit():
+            versions = [int(tag)] if int(tag) in versionIndex else []
+        else:
+            self.logger.warn(
+                "resolveAssetVersion: Unknown version tag '%s' for: %s",
+                versionTag,
+                assetId,
+            )
+            return embeddedVersion
+
+        if not versions:
             self.logger.warn(
-                "resolveAssetVersion: "
-                "Resolving asset path from asset ID failed: %s",
+                "resolveAssetVersion: No version matching '%s' for: %s",
+                versionTag,
                 assetId,
             )
             return None
-        # Version
-        return idFieldDict.get("Version", None)
+        return str(max(versions))
 
+    def getAssetVersionIndex(self, assetId):
+        """
+        Returns all the versions on disk of the given asset ID.
+
+        The index is built from a single scan of the template with the
+        version left out, then cached for the session (until :meth:`reset`)
+        and shared by every asset ID that only differs by its version.
+
+        :returns: Mapping of version number to its (abstract) file path.
+        :rtype: dict
+        """
+        indexKey = self.__getVersionIndexKey(assetId)
+        versionIndex = self._versionIndex.get(indexKey)
+        if versionIndex is not None:
+            self.metrics.increment("cache.versionIndex.hit")
+            return versionIndex
+        self.metrics.increment("cache.versionIndex.miss")
+
+        templateType, fields = indexKey[0], dict(indexKey[1])
+        versionIndex = {}
+        template = self.tk.templates.get(templateType)
+        if template:
+            with self.metrics.timer("templateGlob"):
+                paths = self.tk.abstract_paths_from_template(template, fields)
+            for path in paths:
+                pathFields = template.get_fields(path)
+                version = pathFields.get("version")
+                if version is not None:
+                    versionIndex.setdefault(version, str(path))
+        else:
+            self.logger.warn(
+                "getAssetVersionIndex: Unable to find template: %s",
+                templateType,
+            )
+        self._versionIndex[indexKey] = versionIndex
+        return versionIndex
+
+    def __getVersionIndexKey(self, assetId):
+        """
+        Returns the key shared by all the versions of the given asset ID:
+        its template name and its fields, minus the version.
+        """
+        idFieldDict = self.getAssetFields(assetId) or {}
+        fields = tuple(sorted(
+            (key, value) for key, value in idFieldDict.items()
+            if key.lower() != "version"
+        ))
+        return self.__getAssetPublishType(assetId), fields
+
+    def __getApprovedVersions(self, assetId):
+        """
+        Returns the versions of the asset ID's index approved in Shotgun.
+
+        All the paths of the index are looked up with a single query and
+        the result cached alongside the index.
+        """
+        indexKey = self.__getVersionIndexKey(assetId)
+        approved = self._approvedVersions.get(indexKey)
+        if approved is not None:
+            return approved
+
+        status = os.environ.get("SGTK_KATANA_APPROVED_STATUS", "apr")
+        pathVersions = dict(
+            (path, version)
+            for version, path in self.getAssetVersionIndex(assetId).items()
+        )
+        publishes = {}
+        if pathVersions:
+            try:
+                publishes = sgtk.util.find_publish(
+                    self.tk,
+                    list(pathVersions),
+                    filters=[["sg_status_list", "is", status]],
+                )
+            except Exception as error:
+                self.logger.warn(
+                    "resolveAssetVersion: Failed to query approved "
+                    "publishes for %s: %s",
+                    assetId,
+                    error,
+                )
+        approved = [pathVersions[path] for path in publishes if path in pathVersions]
+        self._approvedVersions[indexKey] = approved
+        return approved
+
+    @_timed
     def getAssetFields(self, assetId, includeDefaults=False):
         """
         Resolves an asset ID to a dict of all of the required fields.
         Returns a dict, keyed by the field names that the corresponding Shotgun template will expect
+
+        With ``includeDefaults``, the template name is also returned, under
+        :data:`TEMPLATE_FIELD`.
         """
-        fullDict = eval(str(assetId)) # TODO: Not cool, but works in this case. Switch to json?
-        fieldDict = fullDict.get("fields") or None
+        templateName, fieldDict = self.__parseAssetId(assetId)
         if not fieldDict:
-            self.logger.warn(
-                "getAssetFields: Couldn't find fields in asset ID: %s",
-                assetId,
-            )
+            # Only IDs which can't be parsed are negatively cached here,
+            # missing files are recorded by resolveAsset()
+            if not self._unresolvedAssets.isKnownBad(assetId):
+                self._unresolvedAssets.record(
+                    assetId,
+                    "getAssetFields: Couldn't find fields in asset ID: %s",
+                    assetId,
+                )
+            return None
+
+        # Callers may modify it, keep the memoised one intact
+        fieldDict = dict(fieldDict)
+        if includeDefaults:
+            fieldDict[TEMPLATE_FIELD] = templateName
         return fieldDict
 
     def __getAssetPublishType(self, assetId):
         '''
         Returns the publish "type" of the asset. This is used to work out the Shotgun template to use.
         '''
-        fullDict = eval(str(assetId)) # TODO: Not cool, but works in this case. Switch to json?
-        templateType = fullDict.get("template") or None
+        templateType = self.__parseAssetId(assetId)[0] or None
         if not templateType:
             self.logger.warn(
                 "getAssetFields: Couldn't find template type in asset ID: %s",
@@ -170,10 +1132,135 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
         """
         Creates a transaction object
         """
-        # In this example plug-in we do not support transactions
-        return None
+        return ShotgunAssetTransaction(self.tk.shotgun, self.logger)
+
+    @staticmethod
+    def buildAssetId(template, fields):
+        """
+        Builds the compact asset ID of the given template name and fields.
+
+        :param template: Name of the template, from templates.yml.
+        :type template: str
+        :param fields: Template fields.
+        :type fields: dict
+        :rtype: str
+        """
+        return formatAssetUri(template, fields)
+
+    def __getCreationIdAndPath(self, fields, args):
+        """
+        Returns the asset ID and file path of an asset about to be created.
+
+        The template name is taken from the :data:`TEMPLATE_FIELD` key of the
+        args or, failing that, of the fields, as returned by
+        ``getAssetFields(assetId, includeDefaults=True)``. All the other
+        fields are template fields.
+        """
+        fields = dict(fields or {})
+        templateName = fields.pop(TEMPLATE_FIELD, None)
+        templateName = (args or {}).get(TEMPLATE_FIELD) or templateName
+        template = self.tk.templates.get(templateName)
+        if not template:
+            raise ValueError("Unable to find template: %s" % templateName)
+        return self.buildAssetId(templateName, fields), template.apply_fields(fields)
+
+    def __getPublishedFileType(self, code):
+        """
+        Returns the PublishedFileType entity of the given code, creating it if
+        needed. Each type is only looked up once.
+        """
+        publishType = self._publishTypes.get(code)
+        if publishType is None:
+            shotgun = self.tk.shotgun
+            entity = shotgun.find_one("PublishedFileType", [["code", "is", code]])
+            if entity is None:
+                entity = shotgun.create("PublishedFileType", {"code": code})
+            publishType = {"type": entity["type"], "id": entity["id"]}
+            self._publishTypes[code] = publishType
+        return publishType
+
+    def createAssetAndPath(self, txn, assetType, fields, args, createDirectory):
+        """
+        Creates an asset ID for the given fields and returns it. Nothing is
+        registered in Shotgun until :meth:`postCreateAsset`.
+        """
+        assetId, path = self.__getCreationIdAndPath(fields, args)
+        if createDirectory:
+            folder = os.path.dirname(path)
+            try:
+                os.makedirs(folder)
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+        return assetId
+
+    def postCreateAsset(self, txn, assetType, fields, args):
+        """
+        Registers the asset, once written to disk, as a PublishedFile.
+
+        When a transaction is given the creation is buffered in it and sent
+        along with all the others on commit, otherwise it is sent right away.
+        """
+        assetId, path = self.__getCreationIdAndPath(fields, args)
+        args = args or {}
+        templateFields = self.getAssetFields(assetId) or {}
+        publishData = sgtk.util.register_publish(
+            self.tk,
+            self.context,
+            path,
+            args.get("name") or os.path.basename(path),
+            templateFields.get("version", 0),
+            comment=args.get("comment", ""),
+            dry_run=True,
+        )
+        # register_publish would look the type up again for every asset
+        publishData["published_file_type"] = self.__getPublishedFileType(
+            args.get("publishType") or PUBLISH_TYPES.get(assetType, assetType)
+        )
+        request = {
+            "request_type": "create",
+            "entity_type": publishData.pop("type", "PublishedFile"),
+            "data": publishData,
+        }
+        if txn is None:
+            self.tk.shotgun.create(request["entity_type"], request["data"])
+        else:
+            txn.add(request)
+
+        self._resolvedPaths[assetId] = path
+        return assetId
+
+
+def getPlugin():
+    """
+    Returns the registered :class:`ShotgunAssetPlugin` instance, giving
+    access to the methods Katana's AssetAPI does not expose.
+
+    :rtype: ShotgunAssetPlugin
+    """
+    return _plugin
+
+
+def dumpMetrics(path=None):
+    """
+    Returns the metrics of the registered plug-in, optionally writing them as
+    JSON to the given path as well. From Katana's Python tab::
+
+        import ShotgunAssetPlugin
+        ShotgunAssetPlugin.dumpMetrics("/tmp/asset_metrics.json")
+
+    :rtype: dict
+    """
+    if path:
+        _plugin.metrics.dump(path)
+    return _plugin.metrics.asDict()
 
 
 # Register the "Shotgun" plug-in - this is the name that will be
 # shown in Katana's Project Settings tab
-AssetAPI.RegisterAssetPlugin("Shotgun", ShotgunAssetPlugin())
+_plugin = ShotgunAssetPlugin()
+AssetAPI.RegisterAssetPlugin("Shotgun", _plugin)
+
+# Katana loads this file by path, make it importable for getPlugin() and
+# dumpMetrics()
+sys.modules.setdefault("ShotgunAssetPlugin", sys.modules[__name__])